@@ -0,0 +1,181 @@
+import json
+import math
+import os
+import random
+from array import array
+
+ITEM_PARAMS_FILE = "item_params.json"  # Per-folder sidecar beside annotations.json: {img_name: {"a": ..., "b": ...}}
+
+# Ability grid the posterior is kept on
+THETA_MIN = -4.0
+THETA_MAX = 4.0
+GRID_POINTS = 41
+THETA_STEP = (THETA_MAX - THETA_MIN) / (GRID_POINTS - 1)
+THETA_GRID = [THETA_MIN + i * THETA_STEP for i in range(GRID_POINTS)]
+
+# Stop a category once the posterior SD of ability falls to this. Weakly discriminating items
+# (a near 1) cannot get there within max_items, so each category's target is raised to the SD
+# its own items are expected to reach one question before max_items
+SE_TARGET = 0.5
+MIN_ITEMS_PER_CATEGORY = 2
+# Exposure control: the next item is the least shown among the RANDOMESQUE_K most informative
+# unused items, plus any others within INFO_TOLERANCE of the best, with ties broken at random
+RANDOMESQUE_K = 3
+INFO_TOLERANCE = 0.9
+
+
+def load_item_params(folder_path):
+    """Read a folder's item_params.json sidecar, or {} if it has not been fitted yet"""
+    params_path = os.path.join(folder_path, ITEM_PARAMS_FILE)
+    if not os.path.exists(params_path):
+        return {}
+    with open(params_path, 'r') as f:
+        return json.load(f)
+
+
+class AdaptiveState:
+    """Per-participant adaptive state: a log-posterior over THETA_GRID per category"""
+
+    __slots__ = ("log_post", "counts", "done")
+
+    def __init__(self, n_folders):
+        # Standard normal prior, unnormalized
+        prior = [-0.5 * theta * theta for theta in THETA_GRID]
+        self.log_post = array("d", prior * n_folders)
+        self.counts = array("H", [0] * n_folders)
+        self.done = array("b", [0] * n_folders)
+
+
+class AdaptiveEngine:
+    """Information-based item selection under a 2PL model, one ability per category.
+
+    Probabilities, log-likelihoods and item rankings are precomputed per grid
+    point, so choosing the next item is a table lookup plus a short scan.
+    Among the near-best items the least shown is asked, so exposure stays
+    balanced across participants as in the non-adaptive assignment.
+    """
+
+    def __init__(self, catalog, params_by_folder, max_items=5, se_target=SE_TARGET, min_items=MIN_ITEMS_PER_CATEGORY):
+        self.catalog = catalog
+        self.max_items = max_items
+        self.se_target = se_target
+        self.min_items = min_items
+
+        n_items = len(catalog)
+        self.p = [None] * n_items
+        self.log_p = [None] * n_items
+        self.log_q = [None] * n_items
+        self.information = [None] * n_items
+        self.ranked = []  # folder index -> grid index -> item IDs by decreasing information
+        for folder in catalog.folders:
+            params = params_by_folder.get(folder, {})
+            info = {}
+            for item_id in catalog.folder_ids[folder]:
+                item_params = params.get(catalog.img_names[item_id], {})
+                a = float(item_params.get("a", 1.0))
+                b = float(item_params.get("b", 0.0))
+                p = [1.0 / (1.0 + math.exp(-a * (theta - b))) for theta in THETA_GRID]
+                self.p[item_id] = array("d", p)
+                self.log_p[item_id] = array("d", [math.log(max(x, 1e-12)) for x in p])
+                self.log_q[item_id] = array("d", [math.log(max(1.0 - x, 1e-12)) for x in p])
+                info[item_id] = self.information[item_id] = array("d", [a * a * x * (1.0 - x) for x in p])
+            self.ranked.append([
+                catalog.new_order(sorted(info, key=lambda item_id: -info[item_id][g]))
+                for g in range(GRID_POINTS)
+            ])
+
+        prior = [math.exp(-0.5 * theta * theta) for theta in THETA_GRID]
+        self.se_targets = array("d", [
+            max(se_target, self._reachable_sd(folder_index, prior, (), max_items - 1))
+            for folder_index in range(len(catalog.folders))
+        ])
+
+    def new_state(self):
+        return AdaptiveState(len(self.catalog.folders))
+
+    def _posterior(self, state, folder_index):
+        """Normalized posterior weights for one category"""
+        start = folder_index * GRID_POINTS
+        log_post = state.log_post[start:start + GRID_POINTS]
+        peak = max(log_post)
+        weights = [math.exp(x - peak) for x in log_post]
+        total = sum(weights)
+        return [w / total for w in weights]
+
+    @staticmethod
+    def _mean_sd(weights):
+        total = sum(weights)
+        mean = sum(w * theta for w, theta in zip(weights, THETA_GRID)) / total
+        variance = sum(w * (theta - mean) ** 2 for w, theta in zip(weights, THETA_GRID)) / total
+        return mean, math.sqrt(variance)
+
+    def estimate(self, state, folder_index):
+        """Posterior mean ability and its standard error for one category"""
+        return self._mean_sd(self._posterior(state, folder_index))
+
+    def _reachable_sd(self, folder_index, weights, administered, n_items):
+        """Posterior SD expected after n_items more answers, averaged over every answer pattern"""
+        theta, sd = self._mean_sd(weights)
+        if n_items <= 0:
+            return sd
+        g = int(round((theta - THETA_MIN) / THETA_STEP))
+        candidates = self._candidates(folder_index, g, administered)
+        if not candidates:
+            return sd
+        item_id = candidates[0]
+        right = [w * x for w, x in zip(weights, self.p[item_id])]
+        wrong = [w - r for w, r in zip(weights, right)]
+        p_right = sum(right) / sum(weights)
+        administered = administered + (item_id,)
+        return (p_right * self._reachable_sd(folder_index, right, administered, n_items - 1)
+                + (1.0 - p_right) * self._reachable_sd(folder_index, wrong, administered, n_items - 1))
+
+    def _candidates(self, folder_index, g, administered):
+        """Unused items worth asking at grid point g: the top RANDOMESQUE_K and any near as informative"""
+        candidates = []
+        best = None
+        for item_id in self.ranked[folder_index][g]:
+            if item_id in administered:
+                continue
+            info = self.information[item_id][g]
+            if best is None:
+                best = info
+            elif len(candidates) >= RANDOMESQUE_K and info < INFO_TOLERANCE * best:
+                break
+            candidates.append(item_id)
+        return candidates
+
+    def update(self, state, item_id, is_correct):
+        """Fold one scored answer into the state and close the category if precise enough"""
+        folder_index = self.catalog.item_folder[item_id]
+        start = folder_index * GRID_POINTS
+        likelihood = self.log_p[item_id] if is_correct else self.log_q[item_id]
+        for g in range(GRID_POINTS):
+            state.log_post[start + g] += likelihood[g]
+        state.counts[folder_index] += 1
+
+        _, se = self.estimate(state, folder_index)
+        if state.counts[folder_index] >= self.max_items:
+            state.done[folder_index] = 1
+        elif state.counts[folder_index] >= self.min_items and se <= self.se_targets[folder_index]:
+            state.done[folder_index] = 1
+
+    def select_next(self, state, administered, exposures=None):
+        """Next item ID to ask, or None when every category is finished.
+
+        Categories are visited in turn (fewest questions asked first). Within a
+        category the candidates are the most informative unused items at the
+        current estimate; exposures(item_id), the times an item has been shown,
+        picks the least shown of them, with ties broken at random.
+        """
+        administered = set(administered)
+        active = [i for i in range(len(self.catalog.folders)) if not state.done[i]]
+        for folder_index in sorted(active, key=lambda i: state.counts[i]):
+            theta, _ = self.estimate(state, folder_index)
+            g = int(round((theta - THETA_MIN) / THETA_STEP))
+            candidates = self._candidates(folder_index, g, administered)
+            if candidates:
+                return min(candidates, key=lambda item_id: (exposures(item_id) if exposures else 0, random.random()))
+            # Nothing left to ask in this category
+            state.done[folder_index] = 1
+        return None
@@ -0,0 +1,12 @@
+import os
+import secrets
+
+# Unlocks the dashboard's admin views, URL profiling and the API's export; unset, they stay closed
+ADMIN_KEY = os.environ.get("QUIZ_ADMIN_KEY")
+
+
+def is_admin_key(key):
+    """Whether key is the configured admin key, compared in constant time; never true without one"""
+    if not ADMIN_KEY or not key:
+        return False
+    return secrets.compare_digest(key.encode(), ADMIN_KEY.encode())
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ACTIVE_SESSIONS = None  # Fixed cap on concurrent quiz sessions; None sizes it from observed usage
+INITIAL_ACTIVE_SESSIONS = 50  # Cap until enough sessions have finished to measure their cost
+MIN_ACTIVE_SESSIONS = 5
+CPU_BUDGET = 0.8 * (os.cpu_count() or 1)  # CPU seconds per second the quiz may use, leaving headroom
+BANDWIDTH_BUDGET = 12.5e6  # Bytes per second of images the uplink can carry (100 Mbit/s)
+MEMORY_BUDGET = 2e9  # Bytes of process memory the sessions may add on top of the shared catalog and images
+ACTIVE_TIMEOUT = 15 * 60  # Seconds without a rerun after which an admitted session is considered abandoned
+WAITING_TIMEOUT = 30  # Waiting pages poll every few seconds; a closed tab leaves the queue after this
+USAGE_SMOOTHING = 0.2  # Weight of the latest finished session in the running usage averages
+DEFAULT_SESSION_SECONDS = 10 * 60  # Assumed session length for wait estimates before any session finishes
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ActiveSession:
+    __slots__ = ("admitted", "last_seen", "cpu", "sent")
+
+    def __init__(self, now):
+        self.admitted = now
+        self.last_seen = now
+        self.cpu = 0.0
+        self.sent = 0
+
+
+class AdmissionControl:
+    """Caps concurrent quiz sessions and queues the rest first come, first served.
+
+    Sessions report the CPU time and image bytes their reruns cost. When
+    one finishes, its per-second usage updates running averages, and the
+    cap becomes the number of such sessions that fit the CPU, bandwidth and
+    memory budgets. Waiting sessions are admitted in arrival order as
+    slots free up; sessions that stop polling or rerunning are dropped.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE_SESSIONS):
+        self.max_active = max_active
+        self.lock = threading.Lock()
+        self.active = {}  # token -> ActiveSession
+        self.waiting = OrderedDict()  # token -> last poll time, in arrival order
+        self.cpu_rate = None  # CPU seconds per second of a session
+        self.send_rate = None  # Image bytes per second of a session
+        self.memory_per_session = None
+        self.session_seconds = None
+        self.baseline_memory = resident_memory()
+
+    def capacity(self):
+        """How many sessions may be active at once"""
+        if self.max_active is not None:
+            return self.max_active
+        if self.session_seconds is None:
+            return INITIAL_ACTIVE_SESSIONS
+        limits = []
+        if self.cpu_rate:
+            limits.append(CPU_BUDGET / self.cpu_rate)
+        if self.send_rate:
+            limits.append(BANDWIDTH_BUDGET / self.send_rate)
+        if self.memory_per_session:
+            limits.append(MEMORY_BUDGET / self.memory_per_session)
+        return max(MIN_ACTIVE_SESSIONS, int(min(limits))) if limits else INITIAL_ACTIVE_SESSIONS
+
+    def _expire(self, now):
+        for token in [t for t, session in self.active.items() if now - session.last_seen > ACTIVE_TIMEOUT]:
+            del self.active[token]
+        for token in [t for t, seen in self.waiting.items() if now - seen > WAITING_TIMEOUT]:
+            del self.waiting[token]
+
+    def _admit(self, now):
+        capacity = self.capacity()
+        while self.waiting and len(self.active) < capacity:
+            token, _ = self.waiting.popitem(last=False)
+            self.active[token] = ActiveSession(now)
+
+    def request(self, token):
+        """0 if the session may run, otherwise its 1-based place in the queue"""
+        now = time.monotonic()
+        with self.lock:
+            if token in self.active:
+                self.active[token].last_seen = now
+                return 0
+            self._expire(now)
+            self.waiting[token] = now  # Keeps its place: assignment updates the value, not the order
+            self._admit(now)
+            if token in self.active:
+                return 0
+            return list(self.waiting).index(token) + 1
+
+    def estimated_wait(self, position):
+        """Seconds until a session at this queue position is likely admitted"""
+        seconds = self.session_seconds or DEFAULT_SESSION_SECONDS
+        return position * seconds / max(1, self.capacity())
+
+    def touch(self, token, cpu=0.0, sent=0):
+        """Record one rerun of an admitted session: its CPU seconds and the image bytes it sent"""
+        with self.lock:
+            session = self.active.get(token)
+            if session is not None:
+                session.last_seen = time.monotonic()
+                session.cpu += cpu
+                session.sent += sent
+
+    def release(self, token, finished=True):
+        """Free a session's slot; a finished session's usage updates the cap"""
+        now = time.monotonic()
+        with self.lock:
+            self.waiting.pop(token, None)
+            session = self.active.pop(token, None)
+            if session is not None and finished:
+                self._observe(session, now)
+            self._expire(now)
+            self._admit(now)
+
+    def _observe(self, session, now):
+        duration = max(now - session.admitted, 1.0)
+
+        def smooth(average, value):
+            return value if average is None else (1 - USAGE_SMOOTHING) * average + USAGE_SMOOTHING * value
+
+        self.session_seconds = smooth(self.session_seconds, duration)
+        self.cpu_rate = smooth(self.cpu_rate, session.cpu / duration)
+        self.send_rate = smooth(self.send_rate, session.sent / duration)
+        memory = resident_memory()
+        if memory is not None and self.baseline_memory is not None:
+            # Growth over the startup footprint, shared by the sessions running now
+            self.memory_per_session = smooth(
+                self.memory_per_session, max(memory - self.baseline_memory, 0) / (len(self.active) + 1)
+            )
+
+    def status(self):
+        """Snapshot of the controller for the admin sidebar"""
+        with self.lock:
+            return {
+                "active": len(self.active),
+                "waiting": len(self.waiting),
+                "capacity": self.capacity(),
+                "cpu_rate": self.cpu_rate,
+                "send_rate": self.send_rate,
+                "memory_per_session": self.memory_per_session,
+                "session_seconds": self.session_seconds
+            }
@@ -1,206 +1,187 @@
 import streamlit as st
-import json
 import os
-import csv
 import time
-import random
+import uuid
 import pandas as pd
+from array import array
 from collections import defaultdict
 
+from quiz_manager import ADAPTIVE_MODE, BUNDLE_MODE, RESULTS_FILE, TRACKING_FILE, normalize_answer
+from quiz_resources import admin_unlocked, current_study, get_admission, get_profiler, get_quiz_manager
+from session_bundle import build_bundle, read_answers, runner
+from session_traces import RECORD_TRACES, TRACE_FILE, new_trace, record, record_answers, save_trace
+
 st.set_page_config(page_title="Advanced Perception Quiz", layout="wide")
 
-# Root directory
-root_dir = r"./"
-
-# Configuration
-IMAGES_PER_FOLDER = 5  # Number of images each user sees per folder
-TRACKING_FILE = "user_image_tracking.json"  # File to track which images have been shown to which users
-RESULTS_FILE = "detailed_results.csv"  # CSV file for storing detailed results
-ANSWER_KEY = {
-    "abstract":"answer",
-    "dynamic_isomorph":"fifth_label",
-    "hierarchial_isomorph": "answer",
-    "mental_composition": "answer",
-    "mental_rotation" : "answer",
-    "paper_folding":"correct_option",
-    "slippage":"violation",
-    "symmetric_isomorph":"asymmetric_label"
-}
-class QuizManager:
-    def __init__(self):
-        self.all_folders = self._get_all_folders()
-        self.all_images = self._load_all_images()
-        self.tracking_data = self._load_tracking_data()
-    
-    def _get_all_folders(self):
-        """Get all folders that contain annotations.json"""
-        folders = []
-        for folder in os.listdir(root_dir):
-            folder_path = os.path.join(root_dir, folder)
-            if os.path.isdir(folder_path):
-                json_path = os.path.join(folder_path, "annotations.json")
-                if os.path.exists(json_path):
-                    folders.append(folder)
-        return sorted(folders)
-    
-    def _load_all_images(self):
-        """Load all images and their questions from all folders"""
-        all_images = {}
-        for folder in self.all_folders:
-            folder_path = os.path.join(root_dir, folder)
-            json_path = os.path.join(folder_path, "annotations.json")
-            
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-            
-            folder_images = {}
-            for img_name, info in data.items():
-                img_path = os.path.join(folder_path, img_name)
-                if os.path.exists(img_path):
-                    question_text = info.get("question", "")
-                    if isinstance(question_text, list):
-                        question_text = question_text[0]
-                    
-                    folder_images[img_name] = {
-                        "img_path": img_path,
-                        "question": question_text,
-                        "answer": info.get(ANSWER_KEY[folder], "")
-                    }
-            
-            all_images[folder] = folder_images
-        
-        return all_images
+# CPU time of this rerun, reported to admission control at the end of the script
+rerun_started = time.thread_time()
+sent_bytes = 0
+
+# Shared quiz manager of the study in the URL; each session pins the dataset snapshot
+# it started on, so reloading changed folders never alters a participant's items mid-quiz
+quiz_manager = get_quiz_manager(current_study())
+if "snapshot" not in st.session_state:
+    st.session_state.snapshot = quiz_manager.snapshot
+snapshot = st.session_state.snapshot
+catalog = snapshot.catalog
+# Questions per category as the instructions state it; adaptive sessions may stop a category early
+if ADAPTIVE_MODE:
+    per_category = f"{min(snapshot.adaptive.min_items, snapshot.adaptive.max_items)} to {snapshot.adaptive.max_items}"
+else:
+    per_category = str(quiz_manager.study.images_per_folder)
+
+# Sessions beyond the cap wait in a queue until a running session finishes
+admission = get_admission()
+if "admission_token" not in st.session_state:
+    st.session_state.admission_token = uuid.uuid4().hex
+
+# Optional anonymized timing trace of the session, for replaying realistic load
+if RECORD_TRACES and "trace" not in st.session_state:
+    st.session_state.trace = new_trace()
+
+
+def trace_event(event, **fields):
+    if RECORD_TRACES:
+        record(st.session_state.trace, event, **fields)
+
+
+def submit_answer(item_id, options):
+    """Record the chosen option and its response time, and move to the next question"""
+    choice = st.session_state[f"q_{st.session_state.current_question}"]
+    if choice is None:
+        st.session_state.missing_answer = True
+        return
+    snapshot = st.session_state.snapshot
     
-    def _load_tracking_data(self):
-        """Load tracking data for image distribution"""
-        if os.path.exists(TRACKING_FILE):
-            with open(TRACKING_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            # Initialize tracking data
-            tracking = {}
-            for folder in self.all_folders:
-                tracking[folder] = {}
-                for img_name in self.all_images[folder].keys():
-                    tracking[folder][img_name] = {
-                        "shown_count": 0,
-                        "shown_to_users": []
-                    }
-            return tracking
-    
-    def _save_tracking_data(self):
-        """Save tracking data to file"""
-        with open(TRACKING_FILE, 'w') as f:
-            json.dump(self.tracking_data, f, indent=2)
-    
-    def get_calibration_images(self):
-        """Get one sample image from each folder for calibration"""
-        calibration_images = {}
-        
-        for folder in self.all_folders:
-            # Get the first available image from each folder for calibration
-            if folder in self.all_images and self.all_images[folder]:
-                img_name = list(self.all_images[folder].keys())[0]
-                calibration_images[folder] = [img_name]
-        
-        return calibration_images
+    # Calculate time taken
+    time_taken = time.time() - st.session_state.question_start_time
     
-    def get_images_for_user(self, user_id):
-        """Get images for a specific user ensuring fair distribution"""
-        user_images = {}
-        
-        for folder in self.all_folders:
-            # Get images that this user hasn't seen
-            available_images = []
-            for img_name, img_data in self.all_images[folder].items():
-                if user_id not in self.tracking_data[folder][img_name]["shown_to_users"]:
-                    available_images.append(img_name)
-            
-            # If we don't have enough unseen images, include some that have been shown least
-            if len(available_images) < IMAGES_PER_FOLDER:
-                # Sort by shown_count to get least shown images
-                all_images_sorted = sorted(
-                    self.all_images[folder].keys(),
-                    key=lambda x: self.tracking_data[folder][x]["shown_count"]
-                )
-                
-                # Add images until we have enough, prioritizing least shown
-                for img_name in all_images_sorted:
-                    if img_name not in available_images:
-                        available_images.append(img_name)
-                    if len(available_images) >= IMAGES_PER_FOLDER:
-                        break
-            
-            # Randomly select IMAGES_PER_FOLDER from available
-            if len(available_images) >= IMAGES_PER_FOLDER:
-                selected_images = random.sample(available_images, IMAGES_PER_FOLDER)
-            else:
-                selected_images = available_images
-            
-            # Update tracking data
-            for img_name in selected_images:
-                if user_id not in self.tracking_data[folder][img_name]["shown_to_users"]:
-                    self.tracking_data[folder][img_name]["shown_to_users"].append(user_id)
-                    self.tracking_data[folder][img_name]["shown_count"] += 1
-            
-            user_images[folder] = selected_images
-        
-        self._save_tracking_data()
-        return user_images
+    # Store response as an option index, and time
+    response = options.index(choice)
+    st.session_state.responses.append(response)
+    st.session_state.times.append(round(time_taken, 2))
+    trace_event("answer", n=st.session_state.current_question, response=response, rt=round(time_taken, 2))
     
-    def get_csv_columns(self):
-        """Generate all CSV column names"""
-        columns = ["name", "age", "gender"]
-        
-        for folder in self.all_folders:
-            for img_name in sorted(self.all_images[folder].keys()):
-                # Remove file extension for cleaner column names
-                img_base = img_name.replace('.png', '').replace('.jpg', '').replace('.jpeg', '')
-                columns.append(f"{folder}_{img_base}_response")
-                columns.append(f"{folder}_{img_base}_time")
-        
-        return columns
+    if ADAPTIVE_MODE:
+        # Update the ability estimate and queue the next question, if any
+        snapshot.adaptive.update(st.session_state.adaptive, item_id, snapshot.catalog.is_correct(item_id, response))
+        quiz_manager.next_adaptive_item(st.session_state.user_id, st.session_state.adaptive, st.session_state.order, snapshot)
     
-    def save_user_results(self, user_data, selected_images, responses, times):
-        """Save user results to CSV"""
-        columns = self.get_csv_columns()
-        
-        # Initialize row with empty values
-        row_data = {}
-        for col in columns:
-            row_data[col] = ""
-        
-        # Fill in user data
-        row_data["name"] = user_data["name"]
-        row_data["age"] = user_data["age"]
-        row_data["gender"] = user_data["gender"]
-        
-        # Fill in responses and times for shown images
-        response_index = 0
-        for folder in self.all_folders:
-            if folder in selected_images:
-                for img_name in selected_images[folder]:
-                    img_base = img_name.replace('.png', '').replace('.jpg', '').replace('.jpeg', '')
-                    response_col = f"{folder}_{img_base}_response"
-                    time_col = f"{folder}_{img_base}_time"
-                    
-                    if response_index < len(responses):
-                        row_data[response_col] = responses[response_index]
-                        row_data[time_col] = times[response_index]
-                        response_index += 1
-        
-        # Create DataFrame and save
-        df_row = pd.DataFrame([row_data])
-        
-        # Check if file exists and append or create
-        if os.path.exists(RESULTS_FILE):
-            df_row.to_csv(RESULTS_FILE, mode='a', header=False, index=False)
-        else:
-            df_row.to_csv(RESULTS_FILE, mode='w', header=True, index=False)
+    # Move to next question
+    st.session_state.current_question += 1
+    st.session_state.question_start_time = time.time()
+
+
+@st.fragment
+def question_view():
+    """The current question. Choosing an option stays in the browser (it is
+    inside a form), and submitting reruns only this fragment, not the page
+    or the sidebar."""
+    with profiler.capture("question", st.session_state.get("user_id")):
+        draw_question()
+
+
+def draw_question():
+    """Body of question_view"""
+    started = time.thread_time()
+    snapshot = st.session_state.snapshot
+    catalog = snapshot.catalog
+    order = st.session_state.order
+    if st.session_state.current_question >= len(order):
+        # The last answer was submitted; the completion view needs the whole page
+        st.rerun()
+    item_id = order[st.session_state.current_question]
+    q = catalog.item(item_id)
+    
+    # Progress indicator
+    if ADAPTIVE_MODE:
+        # The number of questions is not known in advance, only its upper bound
+        total_questions = len(catalog.folders) * quiz_manager.study.images_per_folder
+        progress = (st.session_state.current_question + 1) / total_questions
+        st.progress(progress)
+        st.write(f"Question {st.session_state.current_question + 1} of at most {total_questions}")
+    else:
+        progress = (st.session_state.current_question + 1) / len(order)
+        st.progress(progress)
+        st.write(f"Question {st.session_state.current_question + 1} of {len(order)}")
+    st.write(f"**Category**: {q['folder']}")
+    
+    # Display image
+    image = snapshot.image_bytes(item_id)
+    st.image(image, caption=f"{q['folder']} - {q['img_name']}", width=1000)
+    
+    # Display question
+    st.write("**Question:**")
+    st.write(q["question"])
+    
+    # Determine answer options based on the folder
+    options = catalog.options(item_id)
+    
+    # Answer selection; the choice reaches the server only with the submit click
+    with st.form(f"question_{st.session_state.current_question}", border=False):
+        st.radio("Select your answer:", options, key=f"q_{st.session_state.current_question}", index=None)
+        st.form_submit_button("Submit Answer", type="primary", on_click=submit_answer, args=(item_id, options))
+    
+    if st.session_state.pop("missing_answer", False):
+        st.warning("Please select an answer before submitting.")
+    
+    # Fragment reruns skip the end of the script, so they report their own usage
+    admission.touch(st.session_state.admission_token, time.thread_time() - started, len(image))
+
+
+def bundle_view():
+    """The whole test as one bundle run in the browser.
+
+    Questions and images are sent once, response times are measured client
+    side, and the answers come back in a single message, so no question
+    waits on the server.
+    """
+    global sent_bytes
+    snapshot = st.session_state.snapshot
+    order = st.session_state.order
+    bundle = build_bundle(snapshot, order)
+    value = runner(bundle=bundle, key="bundle_runner", default=None)
+    if value is None:
+        # The bundle is sent with each full rerun until the answers come back
+        sent_bytes += sum(len(item["image"]) for item in bundle["items"])
+        return
+    try:
+        responses, times = read_answers(value, order, snapshot.catalog)
+    except ValueError as e:
+        st.error(f"❌ Could not read your answers: {e}")
+        return
+    st.session_state.responses = responses
+    st.session_state.times = times
+    if RECORD_TRACES:
+        record_answers(st.session_state.trace, responses, times)
+    st.session_state.current_question = len(order)
+    st.rerun()
+
+
+@st.cache_data(show_spinner=False)
+def participation_summary(path, mtime_ns, size):
+    """Participant count, mean age and gender counts of a results file.
+
+    Keyed by the file's modification time and size, so it is read again only
+    after a participant's results are saved.
+    """
+    df = pd.read_csv(path, usecols=["age", "gender"])
+    return len(df), df["age"].mean(), df["gender"].value_counts().to_dict()
+
+
+@st.fragment(run_every=5)
+def waiting_room():
+    """Queue position and estimated wait, refreshed until the session is admitted"""
+    position = admission.request(st.session_state.admission_token)
+    if position == 0:
+        st.rerun()
+    minutes = max(1, round(admission.estimated_wait(position) / 60))
+    st.warning(
+        f"⏳ The quiz is at capacity right now. You are number {position} in the queue "
+        f"(estimated wait: about {minutes} minute{'s' if minutes > 1 else ''}). "
+        "You will be let in automatically; please keep this page open."
+    )
 
-# Initialize quiz manager
-if "quiz_manager" not in st.session_state:
-    st.session_state.quiz_manager = QuizManager()
 
 # Initialize session state
 if "setup_done" not in st.session_state:
@@ -208,17 +189,41 @@ if "setup_done" not in st.session_state:
 if "calibration_done" not in st.session_state:
     st.session_state.calibration_done = False
 
+# Admins can profile live reruns from the dashboard, or from the URL with
+# ?profile=<reruns>[&participant=<id>] once this session has the admin key. The key
+# is asked for in the sidebar, never taken from the URL, which history and logs keep
+profiler = get_profiler()
+if "profile" in st.query_params:
+    with st.sidebar:
+        unlocked = admin_unlocked()
+    if unlocked:
+        reruns = st.query_params.get("profile", "")
+        participant = st.query_params.get("participant", "")
+        if reruns.isdigit():
+            profiler.arm(int(reruns), int(participant) if participant.isdigit() else None)
+        for param in ("profile", "participant"):
+            st.query_params.pop(param, None)
+if not st.session_state.setup_done:
+    phase = "setup"
+elif not st.session_state.calibration_done:
+    phase = "calibration"
+elif st.session_state.get("current_question", 0) < len(st.session_state.get("order", ())):
+    phase = "question"
+else:
+    phase = "completion"
+profiler.begin(phase, st.session_state.get("user_id"))
+
 if not st.session_state.setup_done:
     st.title("Advanced Perception Quiz Setup")
     
-    st.markdown("""
+    st.markdown(f"""
     ### Welcome to the Advanced Perception Quiz
     
     IMPORTANT: The quiz is best taken on a desktop or laptop with a stable internet connection.
     If the user takes it on a mobile device, the layout may be suboptimal, and experience may be affected.            
     
     This quiz will test your visual perception abilities across different cognitive tasks.
-    You will see 5 images from each category, and your responses and reaction times will be recorded.
+    You will see {per_category} images from each category, and your responses and reaction times will be recorded.
     """)
     
     # User information
@@ -240,44 +245,38 @@ if not st.session_state.setup_done:
         "Select the best answer from the options A, B, C, D (or similar options).",
         "You cannot go back to previous questions once submitted.",
         "Your response time for each question will be recorded.",
-        "Each user will see 5 images per category, ensuring fair distribution across participants.",
+        f"Each user will see {per_category} images per category, ensuring fair distribution across participants.",
         "Take your time to understand each question, but answer as accurately as possible."
     ]
     
     for i, instr in enumerate(instructions, 1):
         st.write(f"{i}. {instr}")
     
-    st.info(f"You will answer questions from {len(st.session_state.quiz_manager.all_folders)} different categories: {', '.join(st.session_state.quiz_manager.all_folders)}")
+    st.info(f"You will answer questions from {len(catalog.folders)} different categories: {', '.join(catalog.folders)}")
     
-    if st.button("Start Calibration", type="primary") and name:
-        # Generate unique user ID
-        user_id = f"{name}_{int(time.time())}"
-        
+    # A slot is asked for only once the participant starts, so tabs left open on this page hold none
+    start_requested = st.session_state.get("start_requested", False)
+    if st.button("Start Calibration", type="primary", disabled=start_requested) and name:
         st.session_state.name = name
         st.session_state.age = age
         st.session_state.gender = gender
+        st.session_state.start_requested = start_requested = True
+    
+    if start_requested and admission.request(st.session_state.admission_token):
+        waiting_room()
+    elif start_requested:
+        # Register the participant under a compact unique ID
+        user_id = quiz_manager.register_participant(
+            st.session_state.name, st.session_state.age, st.session_state.gender
+        )
+        
         st.session_state.user_id = user_id
         st.session_state.setup_done = True
         
-        # Get calibration images (one from each folder)
-        st.session_state.calibration_images = st.session_state.quiz_manager.get_calibration_images()
-        
-        # Create calibration questions
-        calibration_questions = []
-        for folder in st.session_state.quiz_manager.all_folders:
-            if folder in st.session_state.calibration_images:
-                for img_name in st.session_state.calibration_images[folder]:
-                    img_data = st.session_state.quiz_manager.all_images[folder][img_name]
-                    calibration_questions.append({
-                        "folder": folder,
-                        "img_name": img_name,
-                        "img_path": img_data["img_path"],
-                        "question": img_data["question"],
-                        "answer": img_data["answer"]
-                    })
-        
-        st.session_state.calibration_questions = calibration_questions
+        # Calibration questions (one from each folder) are shared by all sessions
         st.session_state.current_calibration = 0
+        trace_event("start")
+        trace_event("calibration", n=0)
         
         st.rerun()
 
@@ -297,30 +296,28 @@ elif st.session_state.setup_done and not st.session_state.calibration_done:
     if "current_calibration" not in st.session_state:
         st.session_state.current_calibration = 0
     
-    if st.session_state.current_calibration < len(st.session_state.calibration_questions):
-        q = st.session_state.calibration_questions[st.session_state.current_calibration]
+    calibration_order = snapshot.calibration_order
+    if st.session_state.current_calibration < len(calibration_order):
+        item_id = calibration_order[st.session_state.current_calibration]
+        q = catalog.item(item_id)
         
         # Progress indicator for calibration
-        progress = (st.session_state.current_calibration + 1) / len(st.session_state.calibration_questions)
+        progress = (st.session_state.current_calibration + 1) / len(calibration_order)
         st.progress(progress)
-        st.write(f"Sample {st.session_state.current_calibration + 1} of {len(st.session_state.calibration_questions)}")
+        st.write(f"Sample {st.session_state.current_calibration + 1} of {len(calibration_order)}")
         st.write(f"**Category**: {q['folder']}")
         
         # Display image
-        st.image(q["img_path"], caption=f"Sample from {q['folder']}", width=1000)
+        image = snapshot.image_bytes(item_id)
+        sent_bytes += len(image)
+        st.image(image, caption=f"Sample from {q['folder']}", width=1000)
         
         # Display question
         st.write("**Sample Question:**")
         st.write(q["question"])
         
-        # Determine answer options based on the answer format
-        answer = q["answer"].strip()
-        if q["folder"] in ["abstract","slippage"]:
-            # Format like "A", "B", "C", "D"
-            options = ["A", "B", "C", "D", "E", "F"]
-        else:
-            # Default fallback
-            options = ["A", "B", "C", "D"]
+        # Determine answer options based on the folder
+        options = catalog.options(item_id)
         
         # Answer selection (for practice only)
         choice = st.radio("Try selecting an answer (just for practice):", options, key=f"calibration_{st.session_state.current_calibration}", index=None)
@@ -329,23 +326,25 @@ elif st.session_state.setup_done and not st.session_state.calibration_done:
         with col1:
             if st.button("Next Sample", type="primary"):
                 st.session_state.current_calibration += 1
+                trace_event("calibration", n=st.session_state.current_calibration)
                 st.rerun()
         
         with col2:
             if choice is not None:
-                if choice == answer.strip("()").upper():
+                correct_letter = normalize_answer(q["answer"])
+                if choice == correct_letter:
                     st.success("✅ Correct! Good job!")
                 else:
-                    st.info(f"💡 The correct answer is {answer.strip('()').upper()}")
+                    st.info(f"💡 The correct answer is {correct_letter}")
     
     else:
         # Calibration completed
         st.success("🎉 Calibration completed!")
-        st.markdown("""
+        st.markdown(f"""
         ### Great! Now you know what to expect..
         
         **Important reminders for the actual test:**
-        - You will see 5 questions from each category
+        - You will see {per_category} questions from each category
         - Your response time will be recorded
         - You cannot go back to previous questions
         - Answer as accurately as possible
@@ -355,29 +354,21 @@ elif st.session_state.setup_done and not st.session_state.calibration_done:
         
         if st.button("Start Actual Test", type="primary"):
             st.session_state.calibration_done = True
+            trace_event("test_start")
+            # The test itself runs on the latest dataset snapshot
+            snapshot = st.session_state.snapshot = quiz_manager.snapshot
             
-            # Now get actual images for this user
-            st.session_state.selected_images = st.session_state.quiz_manager.get_images_for_user(st.session_state.user_id)
-            
-            # Create question list from selected images
-            questions = []
-            for folder in st.session_state.quiz_manager.all_folders:
-                for img_name in st.session_state.selected_images[folder]:
-                    img_data = st.session_state.quiz_manager.all_images[folder][img_name]
-                    questions.append({
-                        "folder": folder,
-                        "img_name": img_name,
-                        "img_path": img_data["img_path"],
-                        "question": img_data["question"],
-                        "answer": img_data["answer"]
-                    })
-            
-            # Shuffle questions to randomize order across folders
-            random.shuffle(questions)
-            st.session_state.questions = questions
+            if ADAPTIVE_MODE:
+                # Questions are picked one at a time from the answers so far
+                st.session_state.adaptive = snapshot.adaptive.new_state()
+                st.session_state.order = snapshot.catalog.new_order()
+                quiz_manager.next_adaptive_item(st.session_state.user_id, st.session_state.adaptive, st.session_state.order, snapshot)
+            else:
+                # Now get actual images for this user, as a shuffled array of item IDs
+                st.session_state.order = quiz_manager.get_items_for_user(st.session_state.user_id, snapshot)
             st.session_state.current_question = 0
-            st.session_state.responses = []
-            st.session_state.times = []
+            st.session_state.responses = array("b")
+            st.session_state.times = array("f")
             st.session_state.question_start_time = time.time()
             
             st.rerun()
@@ -387,150 +378,125 @@ else:
     if "current_question" not in st.session_state:
         st.session_state.current_question = 0
     if "responses" not in st.session_state:
-        st.session_state.responses = []
+        st.session_state.responses = array("b")
     if "times" not in st.session_state:
-        st.session_state.times = []
+        st.session_state.times = array("f")
     if "question_start_time" not in st.session_state:
         st.session_state.question_start_time = time.time()
 
-    if st.session_state.current_question < len(st.session_state.questions):
-        q = st.session_state.questions[st.session_state.current_question]
-        
-        # Progress indicator
-        progress = (st.session_state.current_question + 1) / len(st.session_state.questions)
-        st.progress(progress)
-        st.write(f"Question {st.session_state.current_question + 1} of {len(st.session_state.questions)}")
-        st.write(f"**Category**: {q['folder']}")
-        
-        # Display image
-        st.image(q["img_path"], caption=f"{q['folder']} - {q['img_name']}", width=1000)
-        
-        # Display question
-        st.write("**Question:**")
-        st.write(q["question"])
-        
-        # Determine answer options based on the answer format
-        answer = q["answer"].strip()
-        if q["folder"] in ["abstract","slippage"]:
-            # Format like "A", "B", "C", "D"
-            options = ["A", "B", "C", "D", "E", "F"]
+    order = st.session_state.order
+    if st.session_state.current_question < len(order):
+        if BUNDLE_MODE and not ADAPTIVE_MODE:
+            bundle_view()
         else:
-            # Default fallback
-            options = ["A", "B", "C", "D"]
-        
-        # Answer selection
-        choice = st.radio("Select your answer:", options, key=f"q_{st.session_state.current_question}",index=None)
-        
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("Submit Answer", type="primary",disabled=(choice is None)):
-                # Calculate time taken
-                time_taken = time.time() - st.session_state.question_start_time
-                
-                # Store response and time
-                st.session_state.responses.append(choice)
-                st.session_state.times.append(round(time_taken, 2))
-                
-                # Move to next question
-                st.session_state.current_question += 1
-                st.session_state.question_start_time = time.time()
-                
-                st.rerun()
-        
-        with col2:
-            if st.session_state.current_question > 0:
-                elapsed_time = time.time() - st.session_state.question_start_time
-                st.write(f"Time elapsed: {elapsed_time:.1f} seconds")
-
+            question_view()
+    
     else:
         # Quiz completed
         st.title("🎉 Quiz Completed!")
         st.success("Thank you for participating in the Perception Quiz!")
         
-        # Calculate and display results
-        correct_count = 0
-        folder_stats = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for i, q in enumerate(st.session_state.questions):
-            is_correct = st.session_state.responses[i] == q["answer"].strip("()").upper()
-            if is_correct:
-                correct_count += 1
+        # The summary is computed and the results committed once per session;
+        # reruns of this page (sidebar, review grid, reconnects) only read them back
+        if "summary" not in st.session_state:
+            correct_count = 0
+            folder_stats = defaultdict(lambda: {"correct": 0, "total": 0})
             
-            folder_stats[q["folder"]]["total"] += 1
-            if is_correct:
-                folder_stats[q["folder"]]["correct"] += 1
+            for item_id, response in zip(order, st.session_state.responses):
+                is_correct = catalog.is_correct(item_id, response)
+                if is_correct:
+                    correct_count += 1
+                
+                folder = catalog.folder_of(item_id)
+                folder_stats[folder]["total"] += 1
+                if is_correct:
+                    folder_stats[folder]["correct"] += 1
+            
+            st.session_state.summary = {
+                "correct": correct_count,
+                "total": len(order),
+                "folders": dict(folder_stats),
+                "avg_time": sum(st.session_state.times) / len(st.session_state.times)
+            }
+        
+        if not st.session_state.get("results_saved") and "save_error" not in st.session_state:
+            try:
+                user_data = {
+                    "name": st.session_state.name,
+                    "age": st.session_state.age,
+                    "gender": st.session_state.gender
+                }
+                
+                # Keyed by participant ID, so a repeated call cannot add a second row
+                quiz_manager.save_user_results(
+                    user_data, 
+                    order,
+                    st.session_state.responses,
+                    st.session_state.times,
+                    catalog,
+                    participant_id=st.session_state.user_id
+                )
+                st.session_state.results_saved = True
+                if RECORD_TRACES:
+                    trace_event("complete")
+                    save_trace(st.session_state.trace, quiz_manager.study.path(TRACE_FILE))
+                # The session is over; its slot goes to the next one in the queue
+                admission.release(st.session_state.admission_token)
+                
+            except Exception as e:
+                st.session_state.save_error = str(e)
+        
+        summary = st.session_state.summary
         
         # Overall performance
-        overall_accuracy = (correct_count / len(st.session_state.questions)) * 100
-        st.write(f"**Overall Accuracy**: {overall_accuracy:.1f}% ({correct_count}/{len(st.session_state.questions)})")
+        overall_accuracy = (summary["correct"] / summary["total"]) * 100
+        st.write(f"**Overall Accuracy**: {overall_accuracy:.1f}% ({summary['correct']}/{summary['total']})")
         
         # Folder-wise performance
         st.subheader("Performance by Category:")
-        for folder in sorted(folder_stats.keys()):
-            stats = folder_stats[folder]
+        for folder in sorted(summary["folders"].keys()):
+            stats = summary["folders"][folder]
             accuracy = (stats["correct"] / stats["total"]) * 100
             st.write(f"**{folder}**: {accuracy:.1f}% ({stats['correct']}/{stats['total']})")
         
         # Average response time
-        avg_time = sum(st.session_state.times) / len(st.session_state.times)
-        st.write(f"**Average Response Time**: {avg_time:.2f} seconds")
+        st.write(f"**Average Response Time**: {summary['avg_time']:.2f} seconds")
         
-        # Save results
-        try:
-            user_data = {
-                "name": st.session_state.name,
-                "age": st.session_state.age,
-                "gender": st.session_state.gender
-            }
-            
-            st.session_state.quiz_manager.save_user_results(
-                user_data, 
-                st.session_state.selected_images,
-                st.session_state.responses,
-                st.session_state.times
-            )
-            
+        if st.session_state.get("results_saved"):
             st.success("✅ Your results have been saved successfully!")
-            
-        except Exception as e:
-            st.error(f"❌ Error saving results: {str(e)}")
+        else:
+            st.error(f"❌ Error saving results: {st.session_state.save_error}")
+            if st.button("Retry Saving"):
+                del st.session_state.save_error
+                st.rerun()
         
         # Reset option
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Take Quiz Again", type="primary"):
-                # Clear all session state
+                admission.release(st.session_state.admission_token, finished=False)
+                # Clear all session state (the quiz manager is shared, not per session)
                 for key in list(st.session_state.keys()):
-                    if key != "quiz_manager":  # Keep the quiz manager
-                        del st.session_state[key]
+                    del st.session_state[key]
                 st.rerun()
         
-        # with col2:
-        #     st.download_button(
-        #         label="Download Results CSV",
-        #         data=open(RESULTS_FILE, "rb").read() if os.path.exists(RESULTS_FILE) else b"",
-        #         file_name=RESULTS_FILE,
-        #         mime="text/csv"
-        #     )
+        # Everyone's results are downloaded from the researcher dashboard (with the admin
+        # key), which streams a filtered, compressed export rather than the whole file
 
         # Show images, questions, and correct answers in a 5x8 grid
         st.subheader("Review: Images, Questions & Correct Answers")
-        questions = st.session_state.get("questions", [])
         num_rows = 5
         num_cols = 8
-        grid_size = num_rows * num_cols
-        # Pad with empty dicts if less than grid_size
-        padded_questions = questions.copy()
-        if len(padded_questions) < grid_size:
-            padded_questions += [{} for _ in range(grid_size - len(padded_questions))]
         for row in range(num_rows):
             cols = st.columns(num_cols)
             for col_idx in range(num_cols):
                 idx = row * num_cols + col_idx
-                q = padded_questions[idx]
-                if q:
+                if idx < len(order):
+                    q = catalog.item(order[idx])
                     with cols[col_idx]:
-                        st.image(q["img_path"], use_container_width=True)
+                        image = snapshot.image_bytes(order[idx])
+                        sent_bytes += len(image)
+                        st.image(image, use_container_width=True)
                         st.caption(f"{q['folder']} - {q['img_name']}")
                         st.markdown(f"**Q:** {q['question']}")
                         st.markdown(f"**Correct:** {q['answer']}")
@@ -542,24 +508,33 @@ else:
 with st.sidebar:
     st.title("Quiz Statistics")
     
-    if os.path.exists(TRACKING_FILE):
-        tracking_data = st.session_state.quiz_manager.tracking_data
+    if os.path.exists(quiz_manager.study.path(TRACKING_FILE)):
+        tracking_data = quiz_manager.tracking_data
         
         # st.subheader("Image Distribution")
-        # for folder in st.session_state.quiz_manager.all_folders:
+        # for folder in quiz_manager.all_folders:
         #     with st.expander(f"{folder} ({len(tracking_data[folder])} images)"):
         #         for img_name, data in tracking_data[folder].items():
         #             st.write(f"**{img_name}**: shown {data['shown_count']} times")
     
-    if os.path.exists(RESULTS_FILE):
+    results_file = quiz_manager.study.path(RESULTS_FILE)
+    if os.path.exists(results_file):
         try:
-            df = pd.read_csv(RESULTS_FILE)
+            stat = os.stat(results_file)
+            total, mean_age, gender_counts = participation_summary(results_file, stat.st_mtime_ns, stat.st_size)
             st.subheader("Participation Summary")
-            st.write(f"Total participants: {len(df)}")
-            if len(df) > 0:
-                st.write(f"Average age: {df['age'].mean():.1f}")
-                gender_counts = df['gender'].value_counts()
+            st.write(f"Total participants: {total}")
+            if total > 0:
+                st.write(f"Average age: {mean_age:.1f}")
                 for gender, count in gender_counts.items():
                     st.write(f"{gender}: {count}")
         except:
-            pass
\ No newline at end of file
+            pass
+    
+    status = admission.status()
+    st.subheader("Sessions")
+    st.write(f"Active: {status['active']} of {status['capacity']}")
+    st.write(f"Waiting: {status['waiting']}")
+
+admission.touch(st.session_state.admission_token, time.thread_time() - rerun_started, sent_bytes)
+profiler.end()
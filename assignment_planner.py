@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import random
+from collections import defaultdict
+
+ASSIGNMENT_PLAN_FILE = "assignment_plan.json"  # Precomputed blocks of images to hand out per folder
+PLAN_CURSOR_FILE = "assignment_plan_cursors.json"  # How many blocks of each folder were handed out
+
+# Annotation fields used to spread strata evenly across blocks
+STRATIFY_FIELDS = {
+    "mental_rotation": "difficulty",
+    "mental_composition": "difficulty",
+    "paper_folding": "folds"
+}
+
+
+def load_strata(folder, folder_path, img_names):
+    """Stratum label of each image, read from the folder's annotations.json"""
+    field = STRATIFY_FIELDS.get(folder)
+    if field is None:
+        return {}
+    with open(os.path.join(folder_path, "annotations.json"), 'r') as f:
+        data = json.load(f)
+    return {img_name: str(data.get(img_name, {}).get(field, "")) for img_name in img_names}
+
+
+def _stratified_round(img_names, strata, rng):
+    """One pass over img_names, shuffled so every stratum is spread evenly through it"""
+    groups = defaultdict(list)
+    for img_name in img_names:
+        groups[strata.get(img_name, "")].append(img_name)
+    keyed = []
+    for members in groups.values():
+        rng.shuffle(members)
+        # Systematic spacing: member i of a stratum of size m lands near position i / m
+        offset = rng.random()
+        for i, img_name in enumerate(members):
+            keyed.append(((i + offset) / len(members), rng.random(), img_name))
+    keyed.sort()
+    return [img_name for _, _, img_name in keyed]
+
+
+def plan_folder(deficits, block_size, strata=None, seed=None):
+    """Split the wanted exposures of one folder into the fewest blocks of block_size distinct images.
+
+    deficits maps image name -> exposures still needed. Images are laid out round
+    by round (round r holds every image still needing more than r exposures), so
+    exposure counts stay close to even at any point while the blocks are handed out.
+    """
+    rng = random.Random(seed)
+    strata = strata or {}
+    sequence = []
+    for r in range(max(deficits.values(), default=0)):
+        sequence.extend(_stratified_round([name for name, d in deficits.items() if d > r], strata, rng))
+    if not sequence:
+        return []
+
+    block_size = min(block_size, len(deficits))
+    blocks = []
+    block = []
+    i = 0
+    while i < len(sequence):
+        if sequence[i] in block:
+            # Swap in the nearest later image not yet in this block
+            for j in range(i + 1, len(sequence)):
+                if sequence[j] not in block:
+                    sequence[i], sequence[j] = sequence[j], sequence[i]
+                    break
+            else:
+                # Nothing left to swap in; the duplicate exposure is dropped
+                i += 1
+                continue
+        block.append(sequence[i])
+        i += 1
+        if len(block) == block_size:
+            blocks.append(block)
+            block = []
+
+    if block:
+        # Pad the last block with the images that need the fewest exposures
+        for img_name in sorted(deficits, key=lambda name: deficits[name]):
+            if len(block) == block_size:
+                break
+            if img_name not in block:
+                block.append(img_name)
+        blocks.append(block)
+    return blocks
+
+
+class AssignmentPlan:
+    """Precomputed blocks per folder, handed out in order in O(1) per participant"""
+
+    def __init__(self, blocks, cursors=None, config=None):
+        self.blocks = blocks
+        self.cursors = cursors or {folder: 0 for folder in blocks}
+        self.config = config or {}
+
+    def next_block(self, folder, available=None):
+        """Next planned block for a folder, or None once the plan is used up.
+
+        If available is given, blocks that mention images no longer in it are skipped.
+        """
+        blocks = self.blocks.get(folder, [])
+        cursor = self.cursors.get(folder, 0)
+        while cursor < len(blocks):
+            block = blocks[cursor]
+            cursor += 1
+            if available is None or all(img_name in available for img_name in block):
+                self.cursors[folder] = cursor
+                return list(block)
+        self.cursors[folder] = cursor
+        return None
+
+    def remaining(self, folder):
+        return len(self.blocks.get(folder, [])) - self.cursors.get(folder, 0)
+
+    def save(self, plan_file=ASSIGNMENT_PLAN_FILE):
+        with open(plan_file, 'w') as f:
+            json.dump({"config": self.config, "blocks": self.blocks}, f)
+        self.save_cursors()
+
+    def save_cursors(self, cursor_file=PLAN_CURSOR_FILE):
+        with open(cursor_file, 'w') as f:
+            json.dump(self.cursors, f)
+
+    @classmethod
+    def load(cls, plan_file=ASSIGNMENT_PLAN_FILE, cursor_file=PLAN_CURSOR_FILE):
+        """Load a saved plan, or return None if there is none"""
+        if not os.path.exists(plan_file):
+            return None
+        with open(plan_file, 'r') as f:
+            data = json.load(f)
+        cursors = None
+        if os.path.exists(cursor_file):
+            with open(cursor_file, 'r') as f:
+                cursors = json.load(f)
+        return cls(data["blocks"], cursors, data.get("config"))
+
+
+def build_plan(quiz_manager, target_exposures, block_size, stratify=True, seed=None):
+    """Plan the remaining exposures needed for every image to reach target_exposures"""
+    blocks = {}
+    for folder in quiz_manager.all_folders:
+        img_names = list(quiz_manager.all_images[folder].keys())
+        if not img_names:
+            blocks[folder] = []
+            continue
+        deficits = {
+            img_name: max(0, target_exposures - quiz_manager.tracking_data[folder][img_name]["shown_count"])
+            for img_name in img_names
+        }
+        folder_path = os.path.dirname(quiz_manager.all_images[folder][img_names[0]]["img_path"])
+        strata = load_strata(folder, folder_path, img_names) if stratify else None
+        blocks[folder] = plan_folder(deficits, block_size, strata, seed)
+    config = {"target_exposures": target_exposures, "block_size": block_size, "stratify": stratify}
+    return AssignmentPlan(blocks, config=config)
+
+
+def main():
+    # Imported here because quiz_manager loads saved plans from this module
+    from quiz_manager import IMAGES_PER_FOLDER, QuizManager
+
+    parser = argparse.ArgumentParser(description="Precompute balanced image assignments for upcoming participants")
+    parser.add_argument("--target", type=int, required=True, help="Exposures wanted for every image")
+    parser.add_argument("--block-size", type=int, default=IMAGES_PER_FOLDER, help="Images per participant per folder")
+    parser.add_argument("--no-stratify", action="store_true", help="Ignore annotation strata")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    plan = build_plan(QuizManager(), args.target, args.block_size, not args.no_stratify, args.seed)
+    plan.save()
+    sessions = max((len(blocks) for blocks in plan.blocks.values()), default=0)
+    for folder, blocks in sorted(plan.blocks.items()):
+        print(f"{folder}: {len(blocks)} blocks")
+    print(f"Participants needed to reach {args.target} exposures per image: {sessions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import json
+import os
+import re
+
+# Annotation fields worth slicing results by, per folder
+ATTRIBUTE_FIELDS = {
+    "mental_rotation": ["difficulty", "shape", "candidate_order"],
+    "mental_composition": ["net", "correct_shape", "difficulty"],
+    "paper_folding": ["folds"]
+}
+
+# Slippage images encode their concept in the file name, e.g. 93009_spacing.png
+SLIPPAGE_CONCEPT = re.compile(r"^\d+_(.+)\.\w+$")
+
+
+def item_attributes(folder, img_name, info):
+    """Attribute values of one annotated image as {field: str}"""
+    attributes = {}
+    for field in ATTRIBUTE_FIELDS.get(folder, []):
+        value = info.get(field)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = "/".join(str(v) for v in value)
+        attributes[field] = str(value)
+    if folder == "slippage":
+        match = SLIPPAGE_CONCEPT.match(img_name)
+        if match:
+            attributes["concept"] = match.group(1)
+    return attributes
+
+
+def folder_attributes(root, folder, img_names):
+    """Attribute dict of each named image of one folder, as {img_name: {field: str}}"""
+    with open(os.path.join(root, folder, "annotations.json"), 'r') as f:
+        data = json.load(f)
+    return {img_name: item_attributes(folder, img_name, data.get(img_name, {})) for img_name in img_names}
+
+
+def load_attributes(catalog, root):
+    """Attribute dict for every catalog item, indexed by item ID"""
+    attributes = [None] * len(catalog)
+    for folder in catalog.folders:
+        ids = catalog.folder_ids[folder]
+        by_name = folder_attributes(root, folder, [catalog.img_names[item_id] for item_id in ids])
+        for item_id in ids:
+            attributes[item_id] = by_name[catalog.img_names[item_id]]
+    return attributes
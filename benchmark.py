@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+import warnings
+from array import array
+
+import numpy as np
+import pandas as pd
+
+import quiz_manager
+from participants import PARTICIPANT_FIELDS, PARTICIPANTS_FILE
+from results_store import RESULTS_DB
+from quiz_manager import IMAGES_PER_FOLDER, RESULTS_FILE, TRACKING_FILE, QuizManager, SharedCaches
+
+BASELINE_DIR = "benchmark_baselines"
+
+# folders, images per folder, prior participants in the tracking file, rows in the results file
+SCENARIOS = {
+    "small": {"folders": 8, "images": 20, "participants": 100, "result_rows": 100},
+    "medium": {"folders": 20, "images": 1000, "participants": 10000, "result_rows": 1000},
+    "large": {"folders": 100, "images": 5000, "participants": 100000, "result_rows": 1000},
+    "xlarge": {"folders": 100, "images": 50000, "participants": 1000000, "result_rows": 1000}
+}
+DEFAULT_SCENARIOS = ["small", "medium"]
+
+TIME_TOLERANCE = 0.5  # Flag a regression when an operation is this much slower than its baseline
+MEMORY_TOLERANCE = 0.2
+# Differences below these are timer and allocator noise, whatever the ratio
+MIN_TIME_DELTA = 0.005
+MIN_MEMORY_DELTA_MB = 1.0
+DATASET_VERSION = 3  # Bump when the generated files change shape, so stale datasets are regenerated
+
+
+def sample_images(rng, participants, images, per_folder, chunk_cells=10 ** 7):
+    """participants x per_folder image indices, distinct within each row"""
+    chunk = max(1, chunk_cells // images)
+    picks = []
+    for start in range(0, participants, chunk):
+        rows = min(chunk, participants - start)
+        if per_folder < images:
+            picks.append(rng.random((rows, images)).argpartition(per_folder, axis=1)[:, :per_folder])
+        else:
+            picks.append(np.tile(np.arange(images), (rows, 1)))
+    return np.concatenate(picks) if picks else np.empty((0, per_folder), dtype=np.intp)
+
+
+def generate_dataset(path, folders, images, participants, result_rows, seed=0):
+    """Write a synthetic dataset: annotated folders of empty image files, tracking and results files"""
+    rng = np.random.default_rng(seed)
+    folder_names = [f"synthetic_{i:03d}" for i in range(folders)]
+    img_names = [f"{j:06d}.png" for j in range(images)]
+    for folder in folder_names:
+        folder_path = os.path.join(path, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        annotations = {}
+        for img_name in img_names:
+            # The quiz only checks that an image exists; decoding is out of scope here
+            open(os.path.join(folder_path, img_name), 'w').close()
+            annotations[img_name] = {"question": f"Synthetic question for {folder}", "answer": "(a)"}
+        with open(os.path.join(folder_path, "annotations.json"), 'w') as f:
+            json.dump(annotations, f)
+
+    # Every prior participant saw IMAGES_PER_FOLDER random images of every folder
+    per_folder = min(IMAGES_PER_FOLDER, images)
+    user_ids = np.arange(participants, dtype=np.int64)
+    with open(os.path.join(path, PARTICIPANTS_FILE), 'w') as f:
+        f.write(",".join(PARTICIPANT_FIELDS) + "\n")
+        for user in range(participants):
+            f.write(f"{user},{user:032x},user{user},30,Other,0\n")
+    tracking = {}
+    for folder in folder_names:
+        picks = sample_images(rng, participants, images, per_folder).ravel()
+        by_image = np.argsort(picks, kind="stable")
+        users = np.repeat(user_ids, per_folder)[by_image]
+        bounds = np.cumsum(np.bincount(picks, minlength=images))[:-1]
+        tracking[folder] = {
+            img_name: {"shown_count": len(shown), "shown_to_users": shown.tolist()}
+            for img_name, shown in zip(img_names, np.split(users, bounds))
+        }
+    with open(os.path.join(path, TRACKING_FILE), 'w') as f:
+        json.dump(tracking, f)
+    del tracking
+
+    columns = ["participant_id", "name", "age", "gender"]
+    for folder in folder_names:
+        for img_name in img_names:
+            base = quiz_manager.image_base(img_name)
+            columns += [f"{folder}_{base}_response", f"{folder}_{base}_time"]
+    picks = [sample_images(rng, result_rows, images, per_folder) for _ in folder_names]
+    with open(os.path.join(path, RESULTS_FILE), 'w') as f:
+        f.write(",".join(columns) + "\n")
+        for user in range(result_rows):
+            row = [""] * len(columns)
+            row[:4] = [str(user), f"user{user}", "30", "Other"]
+            for folder_index in range(folders):
+                for j in picks[folder_index][user]:
+                    column = 4 + 2 * (folder_index * images + j)
+                    row[column] = "A"
+                    row[column + 1] = f"{rng.uniform(1, 20):.2f}"
+            f.write(",".join(row) + "\n")
+    return folder_names
+
+
+def measure(operation, repeat):
+    """Median wall time over repeat runs, then peak traced memory of one more run"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time_s": statistics.median(times), "peak_mb": peak / 1e6}
+
+
+def run_scenario(name, workdir, repeat):
+    """Generate (or reuse) a scenario's dataset and time QuizManager's operations on it"""
+    config = SCENARIOS[name]
+    path = os.path.join(workdir, name)
+    marker = os.path.join(path, "scenario.json")
+    saved = None
+    if os.path.exists(marker):
+        with open(marker, 'r') as f:
+            saved = json.load(f)
+    if saved is not None and saved.get("version") == DATASET_VERSION and saved["config"] == config:
+        folder_names = saved["folders"]
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        folder_names = generate_dataset(path, **config)
+        with open(marker, 'w') as f:
+            json.dump({"version": DATASET_VERSION, "config": config, "folders": folder_names}, f)
+
+    # Synthetic folders use the common answer field
+    for folder in folder_names:
+        quiz_manager.ANSWER_KEY.setdefault(folder, "answer")
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        # Operations that write are measured on a copy of the files, restored afterwards
+        with open(TRACKING_FILE, 'rb') as f:
+            tracking_bytes = f.read()
+        with open(RESULTS_FILE, 'rb') as f:
+            results_bytes = f.read()
+        with open(PARTICIPANTS_FILE, 'rb') as f:
+            participants_bytes = f.read()
+
+        results = {"__init__": measure(QuizManager, 1)}
+        qm = QuizManager()
+        counter = iter(range(len(qm.participants), 10 ** 9))
+        shared = qm.shared
+
+        def load_all_images():
+            # Folders are memoized in the shared caches; a fresh one each run times the parse, not the memo
+            qm.shared = SharedCaches()
+            qm._load_all_images()
+
+        results["_load_all_images"] = measure(load_all_images, repeat)
+        qm.shared = shared
+        results["_load_tracking_data"] = measure(qm._load_tracking_data, repeat)
+        results["get_images_for_user"] = measure(lambda: qm.get_images_for_user(next(counter)), repeat)
+        results["get_csv_columns"] = measure(qm.get_csv_columns, repeat)
+
+        order = qm.get_items_for_user(next(counter))
+        responses = array("b", [0] * len(order))
+        times = array("f", [5.0] * len(order))
+        user_data = {"name": "bench", "age": 30, "gender": "Other"}
+        results["save_user_results"] = measure(
+            lambda: qm.save_user_results(user_data, order, responses, times, participant_id=next(counter)), repeat
+        )
+        # What the app's sidebar does once per change of the results file
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", pd.errors.DtypeWarning)
+            results["sidebar_results_read"] = measure(lambda: pd.read_csv(RESULTS_FILE, usecols=["age", "gender"]), repeat)
+
+        with open(TRACKING_FILE, 'wb') as f:
+            f.write(tracking_bytes)
+        with open(RESULTS_FILE, 'wb') as f:
+            f.write(results_bytes)
+        with open(PARTICIPANTS_FILE, 'wb') as f:
+            f.write(participants_bytes)
+        qm.results.connection.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(RESULTS_DB + suffix):
+                os.remove(RESULTS_DB + suffix)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """Messages for operations slower or hungrier than their baseline allows"""
+    regressions = []
+    for operation, current in results.items():
+        if operation not in baseline:
+            continue
+        base = baseline[operation]
+        if current["time_s"] > base["time_s"] * (1 + time_tolerance) + MIN_TIME_DELTA:
+            regressions.append(f"{operation}: {current['time_s']:.4f}s vs baseline {base['time_s']:.4f}s")
+        if current["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance) + MIN_MEMORY_DELTA_MB:
+            regressions.append(f"{operation}: {current['peak_mb']:.1f} MB vs baseline {base['peak_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QuizManager on synthetic catalogs and participant populations")
+    parser.add_argument("scenarios", nargs="*", default=DEFAULT_SCENARIOS, help=f"Any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "quiz_benchmark"),
+                        help="Where synthetic datasets are generated and kept between runs")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation; the median time is reported")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {BASELINE_DIR}/")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    regressions = []
+    for name in args.scenarios:
+        results = run_scenario(name, args.workdir, args.repeat)
+        baseline_file = os.path.join(BASELINE_DIR, f"{name}.json")
+        print(f"\n{name}: {SCENARIOS[name]}")
+        for operation, r in results.items():
+            print(f"  {operation:<22} {r['time_s'] * 1000:>10.2f} ms {r['peak_mb']:>10.2f} MB")
+        if args.save_baseline:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(baseline_file, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"  Baseline written to {baseline_file}")
+        elif os.path.exists(baseline_file):
+            with open(baseline_file, 'r') as f:
+                found = compare(results, json.load(f))
+            for message in found:
+                print(f"  REGRESSION {message}")
+            regressions += found
+
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from quiz_manager import RESULTS_FILE, load_catalog
+from results_io import load_response_matrix
+
+N_BOOTSTRAP = 2000
+CONFIDENCE = 0.95
+BATCH_SIZE = 250  # Bootstrap replicates per batch when resampling RTs, to bound memory
+
+
+def resampling_matrix(n_participants, n_bootstrap, seed):
+    """Bootstrap replicate weights: how often each participant is drawn, one row per replicate"""
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_participants, np.full(n_participants, 1.0 / n_participants), size=n_bootstrap).astype(np.int32)
+
+
+def weighted_medians(values, owners, weights):
+    """Median of values in every replicate, where weights[b, owners[i]] is how often value i counts"""
+    order = np.argsort(values)
+    values = values[order]
+    owners = owners[order]
+    medians = np.empty(len(weights))
+    for start in range(0, len(weights), BATCH_SIZE):
+        w = weights[start:start + BATCH_SIZE][:, owners]
+        cumulative = np.cumsum(w, axis=1)
+        half = cumulative[:, -1:] / 2.0
+        medians[start:start + BATCH_SIZE] = values[np.argmax(cumulative >= half, axis=1)]
+    return medians
+
+
+def _median_rt_interval(args):
+    times, seed, n_bootstrap, alpha = args
+    owners, items = np.nonzero(~np.isnan(times))
+    values = times[owners, items]
+    if len(values) == 0:
+        return None, None, None
+    weights = resampling_matrix(times.shape[0], n_bootstrap, seed)
+    medians = weighted_medians(values, owners, weights)
+    low, high = np.nanquantile(medians, [alpha / 2, 1 - alpha / 2])
+    return float(np.median(values)), float(low), float(high)
+
+
+def bootstrap_report(results_file=RESULTS_FILE, n_bootstrap=N_BOOTSTRAP, confidence=CONFIDENCE, seed=0, workers=1):
+    """Participant-level cluster bootstrap CIs for accuracy and median RT per category.
+
+    Whole participants are resampled, since answers from one person are correlated.
+    Every category uses the same resampling matrix, so intervals are comparable.
+    """
+    catalog = load_catalog()
+    scores, times = load_response_matrix(results_file, catalog, with_times=True)
+    n_participants = scores.shape[0]
+    alpha = 1 - confidence
+    weights = resampling_matrix(n_participants, n_bootstrap, seed)
+
+    # Per participant and category: answers given and answers correct
+    answered = np.stack([(~np.isnan(scores[:, list(catalog.folder_ids[f])])).sum(axis=1) for f in catalog.folders], axis=1)
+    correct = np.stack([np.nansum(scores[:, list(catalog.folder_ids[f])], axis=1) for f in catalog.folders], axis=1)
+
+    # Accuracy for every replicate and category in two matrix products
+    with np.errstate(invalid="ignore", divide="ignore"):
+        replicate_accuracy = (weights @ correct) / (weights @ answered)
+    # A category no replicate drew an answer for (one nobody has answered) stays NaN instead of warning
+    accuracy_low = np.full(len(catalog.folders), np.nan)
+    accuracy_high = np.full(len(catalog.folders), np.nan)
+    observed = ~np.isnan(replicate_accuracy).all(axis=0)
+    if observed.any():
+        accuracy_low[observed], accuracy_high[observed] = np.nanquantile(
+            replicate_accuracy[:, observed], [alpha / 2, 1 - alpha / 2], axis=0
+        )
+
+    jobs = [(times[:, list(catalog.folder_ids[f])], seed, n_bootstrap, alpha) for f in catalog.folders]
+    if workers > 1:
+        with Pool(workers) as pool:
+            rt_intervals = pool.map(_median_rt_interval, jobs)
+    else:
+        rt_intervals = [_median_rt_interval(job) for job in jobs]
+
+    rows = []
+    for c, folder in enumerate(catalog.folders):
+        total_answered = int(answered[:, c].sum())
+        median_rt, rt_low, rt_high = rt_intervals[c]
+        rows.append({
+            "category": folder,
+            "participants": int((answered[:, c] > 0).sum()),
+            "responses": total_answered,
+            "accuracy": correct[:, c].sum() / total_answered if total_answered else np.nan,
+            "accuracy_low": accuracy_low[c],
+            "accuracy_high": accuracy_high[c],
+            "median_rt": median_rt,
+            "median_rt_low": rt_low,
+            "median_rt_high": rt_high
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for per-category accuracy and median RT")
+    parser.add_argument("--results", default=RESULTS_FILE, help="Detailed results CSV")
+    parser.add_argument("--bootstrap", type=int, default=N_BOOTSTRAP, help="Number of bootstrap replicates")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Processes for the per-category RT bootstrap")
+    parser.add_argument("-o", "--output", help="Also write the table to this CSV")
+    args = parser.parse_args()
+
+    start = time.time()
+    report = bootstrap_report(args.results, args.bootstrap, args.confidence, args.seed, args.workers)
+    if args.output:
+        report.to_csv(args.output, index=False)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print(f"Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from attributes import load_attributes
+from image_cache import Image  # PIL's, with the pixel limit image_cache lifts for the largest grids
+from quiz_manager import load_catalog, options_for_folder, root_dir
+
+SHARD_DIR = "shards"
+INDEX_FILE = "index.json"
+PAD_COLOR = (255, 255, 255)
+
+
+def parse_size(text):
+    """"224" -> (224, 224); "640x480" -> (640, 480) as (width, height)"""
+    if "x" in text:
+        width, height = text.lower().split("x")
+        return int(width), int(height)
+    return int(text), int(text)
+
+
+def decode_resized(img_path, sizes):
+    """Decode an image once and fit it into each size canvas, keeping aspect ratio, as uint8 HxWx3 arrays"""
+    with Image.open(img_path) as img:
+        largest = (max(w for w, _ in sizes), max(h for _, h in sizes))
+        # Shrink to the largest target before any mode conversion so no full-size copy is made
+        img.thumbnail(largest, Image.Resampling.LANCZOS)
+        img = img.convert("RGBA")
+    resized = []
+    for width, height in sizes:
+        scaled = img.copy()
+        scaled.thumbnail((width, height), Image.Resampling.LANCZOS)
+        # Most stimuli are RGBA; flatten transparency onto the pad color
+        canvas = Image.new("RGBA", (width, height), PAD_COLOR + (255,))
+        canvas.alpha_composite(scaled, ((width - scaled.width) // 2, (height - scaled.height) // 2))
+        resized.append(np.asarray(canvas.convert("RGB"), dtype=np.uint8))
+    return resized
+
+
+def export(out_dir=SHARD_DIR, sizes=((448, 448),), workers=2, root=None):
+    """Write one memory-mappable .npy shard per folder and size, plus a JSON index"""
+    root = root_dir if root is None else root
+    catalog = load_catalog(root)
+    attributes = load_attributes(catalog, root)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Question texts repeat within a folder, so the index stores each once
+    questions = []
+    question_index = {}
+    index = {"sizes": [f"{w}x{h}" for w, h in sizes], "questions": questions, "folders": {}}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for folder in catalog.folders:
+            ids = list(catalog.folder_ids[folder])
+            items = []
+            for item_id in ids:
+                question = catalog.questions[item_id]
+                if question not in question_index:
+                    question_index[question] = len(questions)
+                    questions.append(question)
+                items.append({
+                    "img_name": catalog.img_names[item_id],
+                    "question": question_index[question],
+                    "answer": catalog.correct_letter(item_id),
+                    "raw_answer": catalog.answers[item_id],
+                    "attributes": attributes[item_id]
+                })
+
+            shards = {}
+            arrays = []
+            for width, height in sizes:
+                name = f"{folder}_{width}x{height}.npy"
+                arrays.append(np.lib.format.open_memmap(
+                    os.path.join(out_dir, name), mode="w+", dtype=np.uint8, shape=(len(ids), height, width, 3)
+                ))
+                shards[f"{width}x{height}"] = name
+            decoded = pool.map(lambda item_id: decode_resized(catalog.img_paths[item_id], sizes), ids)
+            for row, resized in enumerate(decoded):
+                for shard, pixels in zip(arrays, resized):
+                    shard[row] = pixels
+            for shard in arrays:
+                shard.flush()
+            del arrays
+
+            index["folders"][folder] = {"options": options_for_folder(folder), "items": items, "shards": shards}
+
+    with open(os.path.join(out_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+class ShardDataset:
+    """Read-only view over exported shards.
+
+    Pixel batches are slices of a read-only memory map: nothing is decoded or
+    copied, and processes reading the same shard share one page-cache copy.
+    """
+
+    def __init__(self, out_dir=SHARD_DIR, size=None):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, INDEX_FILE), 'r') as f:
+            self.index = json.load(f)
+        self.size = size or self.index["sizes"][0]
+        self.questions = self.index["questions"]
+        self._shards = {}
+
+    @property
+    def folders(self):
+        return list(self.index["folders"])
+
+    def pixels(self, folder):
+        """All images of a folder as an N x H x W x 3 uint8 memory map"""
+        if folder not in self._shards:
+            name = self.index["folders"][folder]["shards"][self.size]
+            self._shards[folder] = np.load(os.path.join(self.out_dir, name), mmap_mode="r")
+        return self._shards[folder]
+
+    def items(self, folder):
+        """Index entries of a folder, with the question text filled in"""
+        return [dict(item, question=self.questions[item["question"]]) for item in self.index["folders"][folder]["items"]]
+
+    def batches(self, folder, batch_size=32):
+        """Yield (pixels, items) batches for a folder in shard order"""
+        pixels = self.pixels(folder)
+        items = self.items(folder)
+        for start in range(0, len(items), batch_size):
+            yield pixels[start:start + batch_size], items[start:start + batch_size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export decoded, resized images as memory-mapped uint8 shards")
+    parser.add_argument("--out", default=SHARD_DIR, help="Output directory")
+    parser.add_argument("--size", action="append", help="Resolution as N or WxH; repeat for several (default 448)")
+    parser.add_argument("--workers", type=int, default=2, help="Decode threads (each holds one full-size image)")
+    args = parser.parse_args()
+
+    start = time.time()
+    sizes = [parse_size(s) for s in (args.size or ["448"])]
+    index = export(args.out, sizes, args.workers)
+    for folder, entry in sorted(index["folders"].items()):
+        print(f"{folder}: {len(entry['items'])} images -> {', '.join(entry['shards'].values())}")
+    print(f"Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
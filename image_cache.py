@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import io
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+# Stimuli are trusted and some grids are ~100 megapixels, above PIL's bomb-check default
+Image.MAX_IMAGE_PIXELS = None
+
+DISPLAY_WIDTH = 2000  # Pages show images at most 1000px wide; twice that stays sharp on high-DPI screens
+WARMUP_WORKERS = 4  # Each worker holds one full-size decoded image (up to ~400 MB for the largest grids)
+# Decodes running at once across all sessions and warmup threads. Shrinking the
+# largest grids peaks near 850 MB each, so this bounds memory under bursts of sessions
+DECODE_SLOTS = 2
+
+
+def encode_display(img_path, width=DISPLAY_WIDTH, image_format="PNG"):
+    """Fully decode an image and return it as PNG (or image_format) bytes no wider than width.
+
+    Decoding every pixel is what catches truncated or corrupt files, which
+    an existence check or Image.verify() can miss.
+    """
+    with Image.open(img_path) as img:
+        img.load()
+        if img.width > width:
+            img.thumbnail((width, img.height), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        # Stimuli are line drawings, so WebP is used lossless; it is still several times smaller than PNG
+        img.save(buffer, format=image_format, **({"lossless": True} if image_format == "WEBP" else {}))
+    return buffer.getvalue()
+
+
+def file_digest(img_path):
+    """Hash of a file's content, which identifies an image however many folders hold a copy"""
+    digest = hashlib.blake2b()
+    with open(img_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """Display-size encoded images, shared by all sessions.
+
+    Bytes are stored by a hash of the source file's content, so an image
+    that several folders or studies hold a copy of is decoded and kept
+    once. Each path is hashed the first time it is asked for. Bytes are
+    dropped once no live cache sharing the store has a path with their digest.
+    """
+
+    def __init__(self, width=DISPLAY_WIDTH, decode_slots=DECODE_SLOTS, share=None):
+        self.width = width
+        if share is None:
+            self.lock = threading.Lock()
+            self._encoded = {}  # content digest -> encoded bytes, shared with the caches made by without()
+            self._pending = {}  # content digest -> Event set when its decode finishes
+            self._decode_slots = threading.BoundedSemaphore(decode_slots)
+            self._refs = {}  # content digest -> paths mapped to it across the live caches
+            self._released = []  # digests of collected caches, uncounted at the next change
+        else:
+            # Old and new caches decode side by side, so they share storage, locks and decode slots
+            self.lock = share.lock
+            self._encoded = share._encoded
+            self._pending = share._pending
+            self._decode_slots = share._decode_slots
+            self._refs = share._refs
+            self._released = share._released
+        self._digests = {}  # img_path -> content digest
+        # Collection can happen while this thread holds the lock, so the finalizer only queues the digests
+        weakref.finalize(self, self._released.extend, self._digests.values())
+
+    def __len__(self):
+        return len(self._encoded)
+
+    def nbytes(self):
+        return sum(len(data) for data in list(self._encoded.values()))
+
+    def without(self, img_paths):
+        """A new cache sharing this one's bytes except for img_paths, which are hashed again.
+
+        A changed file gets a new digest and is decoded again; an unchanged
+        one finds its bytes still stored. The old cache keeps the digests it
+        had, so sessions finishing on the old snapshot still see the old images.
+        """
+        dropped = set(img_paths)
+        cache = ImageCache(self.width, share=self)
+        with self.lock:
+            for path, digest in self._digests.items():
+                if path not in dropped:
+                    cache._digests[path] = digest
+                    self._refs[digest] += 1
+            self._prune()
+        return cache
+
+    def _prune(self):
+        """Uncount the digests of collected caches and drop bytes no cache refers to; call with the lock held"""
+        while self._released:
+            digest = self._released.pop()
+            count = self._refs[digest] - 1
+            if count:
+                self._refs[digest] = count
+            else:
+                del self._refs[digest]
+                self._encoded.pop(digest, None)
+
+    def _digest(self, img_path):
+        digest = self._digests.get(img_path)
+        if digest is None:
+            digest = file_digest(img_path)
+            with self.lock:
+                known = self._digests.get(img_path)
+                if known is None:
+                    self._digests[img_path] = digest
+                    self._refs[digest] = self._refs.get(digest, 0) + 1
+                    self._prune()
+                else:
+                    digest = known
+        return digest
+
+    def get(self, img_path):
+        """Encoded bytes for an image, decoding it on first use.
+
+        Sessions asking for an image that is being decoded wait for that
+        decode instead of starting their own, and at most DECODE_SLOTS
+        images are decoded at once, so a burst of new sessions cannot hold
+        more full-size copies than that.
+        """
+        digest = self._digest(img_path)
+        data = self._encoded.get(digest)
+        if data is not None:
+            return data
+        with self.lock:
+            data = self._encoded.get(digest)
+            if data is not None:
+                return data
+            pending = self._pending.get(digest)
+            if pending is None:
+                pending = self._pending[digest] = threading.Event()
+                decoding = True
+            else:
+                decoding = False
+        if not decoding:
+            pending.wait()
+            data = self._encoded.get(digest)
+            # None if the decode failed; decoding again reports the error to this caller too
+            return data if data is not None else encode_display(img_path, self.width)
+        try:
+            with self._decode_slots:
+                data = encode_display(img_path, self.width)
+            with self.lock:
+                self._encoded[digest] = data
+                self._prune()
+        finally:
+            with self.lock:
+                del self._pending[digest]
+            pending.set()
+        return data
+
+    def warmup(self, img_paths, workers=WARMUP_WORKERS, progress=None):
+        """Decode, verify and cache every image in a thread pool.
+
+        progress(done, total, img_path) is called as each image finishes.
+        Returns {img_path: error message} for images that failed to decode.
+        """
+        failed = {}
+        img_paths = list(img_paths)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.get, img_path): img_path for img_path in img_paths}
+            for done, future in enumerate(as_completed(futures), 1):
+                img_path = futures[future]
+                try:
+                    future.result()
+                except (OSError, SyntaxError, ValueError) as e:
+                    # PIL reports truncated and malformed files as OSError or SyntaxError
+                    failed[img_path] = str(e)
+                if progress is not None:
+                    progress(done, len(img_paths), img_path)
+        return failed
+
+
+def print_progress(done, total, img_path):
+    print(f"[{done}/{total}] {img_path}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode and verify every quiz image, reporting any that fail")
+    parser.add_argument("--workers", type=int, default=WARMUP_WORKERS, help="Decode threads")
+    parser.add_argument("--width", type=int, default=DISPLAY_WIDTH, help="Display width the cache encodes to")
+    args = parser.parse_args()
+
+    from quiz_manager import load_catalog
+
+    start = time.time()
+    cache = ImageCache(args.width, decode_slots=args.workers)
+    failed = cache.warmup(load_catalog().img_paths, args.workers, print_progress)
+    print(f"Cached {len(cache)} images ({cache.nbytes() / 1e6:.1f} MB) in {time.time() - start:.2f}s")
+    for img_path, error in sorted(failed.items()):
+        print(f"FAILED {img_path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from scipy.special import expit, roots_hermitenorm
+
+from adaptive import ITEM_PARAMS_FILE
+from quiz_manager import RESULTS_FILE, load_catalog, root_dir
+from results_io import load_response_matrix
+
+QUADRATURE_POINTS = 21
+A_BOUNDS = (0.2, 4.0)  # Keep discriminations in a sensible range when an item has few answers
+B_BOUNDS = (-6.0, 6.0)
+
+
+def fit_folder(scores, model="2pl", iterations=200, tol=1e-4):
+    """Marginal maximum likelihood (Bock-Aitkin EM) for one folder's items.
+
+    scores is participants x items with NaN for items a participant was not shown,
+    which is most of the matrix since everyone sees only a few items per folder.
+    Returns discrimination a, difficulty b and log-likelihood.
+    """
+    # Only participants who answered something in this folder carry information
+    scores = scores[~np.isnan(scores).all(axis=1)]
+    shown = ~np.isnan(scores)
+    correct = np.where(shown, scores, 0.0)
+    wrong = shown - correct
+
+    nodes, weights = roots_hermitenorm(QUADRATURE_POINTS)
+    log_prior = np.log(weights / weights.sum())
+
+    n_items = scores.shape[1]
+    a = np.ones(n_items)
+    d = np.zeros(n_items)  # Intercept; difficulty b = -d / a
+    log_likelihood = -np.inf
+
+    for _ in range(iterations):
+        # E-step: posterior over quadrature nodes for every participant at once
+        z = np.outer(a, nodes) + d[:, None]
+        log_p = -np.logaddexp(0.0, -z)
+        log_q = -np.logaddexp(0.0, z)
+        joint = correct @ log_p + wrong @ log_q + log_prior
+        peak = joint.max(axis=1, keepdims=True)
+        posterior = np.exp(joint - peak)
+        marginal = posterior.sum(axis=1, keepdims=True)
+        posterior /= marginal
+        new_log_likelihood = float((np.log(marginal) + peak).sum())
+
+        # Expected correct answers and expected answers per item and node
+        r = correct.T @ posterior
+        n = shown.T @ posterior
+
+        # M-step: one Newton step per item on (a, d), all items together
+        p = expit(np.outer(a, nodes) + d[:, None])
+        residual = r - n * p
+        info = n * p * (1.0 - p) + 1e-9
+        grad_d = residual.sum(axis=1) - d / 4.0  # N(0, 2^2) prior on the intercept
+        h_dd = info.sum(axis=1) + 1 / 4.0
+        if model == "2pl":
+            grad_a = (residual * nodes).sum(axis=1) - (a - 1.0)  # N(1, 1) prior on the slope
+            h_aa = (info * nodes ** 2).sum(axis=1) + 1.0
+            h_ad = (info * nodes).sum(axis=1)
+            det = h_aa * h_dd - h_ad ** 2
+            a = np.clip(a + (h_dd * grad_a - h_ad * grad_d) / det, *A_BOUNDS)
+            d = d + (h_aa * grad_d - h_ad * grad_a) / det
+        else:
+            d = d + grad_d / h_dd
+
+        if abs(new_log_likelihood - log_likelihood) < tol:
+            log_likelihood = new_log_likelihood
+            break
+        log_likelihood = new_log_likelihood
+
+    b = np.clip(-d / a, *B_BOUNDS)
+    return a, b, log_likelihood
+
+
+def calibrate(results_file=RESULTS_FILE, model="2pl", iterations=200, write=True, root=None):
+    """Fit every folder and write item_params.json beside each annotations.json"""
+    root = root_dir if root is None else root
+    catalog = load_catalog(root)
+    scores = load_response_matrix(results_file, catalog)
+    fitted = {}
+    for folder in catalog.folders:
+        ids = np.asarray(catalog.folder_ids[folder], dtype=np.intp)
+        folder_scores = scores[:, ids]
+        answered = (~np.isnan(folder_scores)).sum(axis=0)
+        if answered.sum() == 0:
+            continue
+        a, b, log_likelihood = fit_folder(folder_scores, model, iterations)
+        p_correct = np.nansum(folder_scores, axis=0) / np.maximum(answered, 1)
+        params = {}
+        for j, item_id in enumerate(ids):
+            if answered[j] == 0:
+                # No data: leave the item at the engine defaults
+                continue
+            params[catalog.img_names[item_id]] = {
+                "a": round(float(a[j]), 4),
+                "b": round(float(b[j]), 4),
+                "n": int(answered[j]),
+                "p_correct": round(float(p_correct[j]), 4)
+            }
+        fitted[folder] = {"params": params, "log_likelihood": log_likelihood}
+        if write:
+            with open(os.path.join(root, folder, ITEM_PARAMS_FILE), 'w') as f:
+                json.dump(params, f, indent=2)
+    return fitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit 1PL/2PL IRT item parameters from accumulated quiz results")
+    parser.add_argument("--results", default=RESULTS_FILE, help="Detailed results CSV")
+    parser.add_argument("--model", choices=["1pl", "2pl"], default="2pl")
+    parser.add_argument("--iterations", type=int, default=200, help="Maximum EM iterations per folder")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, do not write item_params.json")
+    args = parser.parse_args()
+
+    start = time.time()
+    fitted = calibrate(args.results, args.model, args.iterations, write=not args.dry_run)
+    for folder, result in sorted(fitted.items()):
+        params = result["params"]
+        print(f"{folder}: {len(params)} items, log-likelihood {result['log_likelihood']:.1f}")
+        for img_name, p in sorted(params.items(), key=lambda kv: kv[1]["b"]):
+            print(f"  {img_name:<45} a={p['a']:.2f} b={p['b']:+.2f} n={p['n']} p={p['p_correct']:.2f}")
+    print(f"Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import os
+import time
+
+from participants import PARTICIPANTS_FILE, ParticipantRegistry
+from quiz_manager import RESULTS_FILE, TRACKING_FILE
+from results_store import RESULTS_DB, ResultStore
+
+USER_COLUMNS = ["participant_id", "name", "age", "gender"]
+
+
+def merged_header(paths):
+    """Union of the shards' columns: participant fields first, then item columns in first-seen order"""
+    header = list(USER_COLUMNS)
+    seen = set(header)
+    for path in paths:
+        with open(path, newline="") as f:
+            for column in next(csv.reader(f), []):
+                if column not in seen:
+                    seen.add(column)
+                    header.append(column)
+    return header
+
+
+def row_key(row):
+    """Digest of a participant row's non-empty fields, independent of column order"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column, value in sorted(row.items()):
+        if value != "":
+            digest.update(f"{column}\x1f{value}\x1e".encode())
+    return digest.digest()
+
+
+def merge_results(paths, output, remaps=None):
+    """Stream result shards into one CSV, dropping participants already written.
+
+    Participant IDs of shard i are translated through remaps[i]. Without
+    remaps, IDs from several shards could collide and are left blank.
+    Only the column union and one 16-byte digest per participant are kept in
+    memory, so shards of any size can be merged.
+    """
+    header = merged_header(paths)
+    seen = set()
+    written = duplicates = 0
+    with open(output, 'w', newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=header, restval="")
+        writer.writeheader()
+        for i, path in enumerate(paths):
+            with open(path, newline="") as f:
+                for row in csv.DictReader(f, restval=""):
+                    if row.get("participant_id"):
+                        if remaps and remaps[i]:
+                            row["participant_id"] = remaps[i].get(int(row["participant_id"]), "")
+                        elif len(paths) > 1:
+                            row["participant_id"] = ""
+                    key = row_key(row)
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                    writer.writerow(row)
+                    written += 1
+    return written, duplicates
+
+
+def merge_participants(paths):
+    """One registry over several participant tables, deduplicated by participant key.
+
+    Returns the registry and, per table, a map from its local IDs to merged IDs.
+    A path of "-" stands for a shard without a table.
+    """
+    registry = ParticipantRegistry(None)
+    remaps = []
+    for path in paths:
+        remap = {}
+        if path == "-":
+            # A shard from before the registry, which only has legacy user strings
+            remaps.append(remap)
+            continue
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                remap[int(row["id"])] = registry.register(
+                    row["name"], row["age"], row["gender"], key=row["key"], started=float(row["started"] or 0)
+                )
+        remaps.append(remap)
+    return registry, remaps
+
+
+def merge_stores(paths, output, remaps):
+    """Combine result stores into one keyed by merged participant IDs.
+
+    Store i's IDs are translated through remaps[i], so the merged store lines
+    up with the merged participants table; a participant recorded on several
+    machines keeps the first record. Returns (records written, duplicates).
+    """
+    store = ResultStore(output)
+    written = duplicates = 0
+    for path, remap in zip(paths, remaps):
+        for participant_id, name, age, gender, completed, items in ResultStore(path).records():
+            if participant_id not in remap:
+                raise ValueError(f"{path} has participant {participant_id}, who is not in its participants table")
+            user_data = {"name": name, "age": age, "gender": gender}
+            if store.save(remap[participant_id], user_data, items, completed):
+                written += 1
+            else:
+                duplicates += 1
+    return written, duplicates
+
+
+def merge_users(a, b):
+    """Sorted, duplicate-free union of two sorted user lists"""
+    merged = []
+    for user_id in heapq.merge(a, b):
+        if not merged or merged[-1] != user_id:
+            merged.append(user_id)
+    return merged
+
+
+def merge_tracking(paths, output, registry, remaps=None):
+    """Combine tracking shards: an image's users are the union over shards and shown_count is their number.
+
+    Integer IDs of shard i are translated through remaps[i]; legacy
+    "<name>_<time>" strings are registered in registry. Shards are read one
+    at a time and merged into sorted ID lists, so at most one shard is held in
+    memory next to the result. A participant counted on several machines is
+    counted once.
+    """
+    merged = {}
+    for i, path in enumerate(paths):
+        remap = remaps[i] if remaps else None
+        with open(path, 'r') as f:
+            shard = json.load(f)
+        for folder, images in shard.items():
+            folder_tracking = merged.setdefault(folder, {})
+            for img_name, data in images.items():
+                users = set()
+                for user in data.get("shown_to_users", []):
+                    if isinstance(user, str):
+                        users.add(registry.legacy_id(user))
+                    elif not remap:
+                        raise ValueError(f"{path} uses participant IDs; pass its participants table too")
+                    else:
+                        users.add(remap[user])
+                folder_tracking[img_name] = merge_users(folder_tracking.get(img_name, []), sorted(users))
+        del shard
+
+    tracking = {
+        folder: {
+            img_name: {"shown_count": len(users), "shown_to_users": users}
+            for img_name, users in sorted(images.items())
+        }
+        for folder, images in sorted(merged.items())
+    }
+    with open(output, 'w') as f:
+        json.dump(tracking, f, separators=(",", ":"))
+    return tracking
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge results and tracking files from several quiz deployments")
+    parser.add_argument("--results", nargs="*", default=[], help="detailed_results.csv shards")
+    parser.add_argument("--tracking", nargs="*", default=[], help="user_image_tracking.json shards")
+    parser.add_argument("--participants", nargs="*", default=[],
+                        help="participants.csv of each deployment, in shard order ('-' for deployments without one)")
+    parser.add_argument("--stores", nargs="*", default=[],
+                        help="results.sqlite of each deployment, in the same order as --participants")
+    parser.add_argument("--results-out", default=RESULTS_FILE, help="Merged results CSV")
+    parser.add_argument("--tracking-out", default=TRACKING_FILE, help="Merged tracking JSON")
+    parser.add_argument("--participants-out", default=PARTICIPANTS_FILE, help="Merged participants table")
+    parser.add_argument("--stores-out", default=RESULTS_DB, help="Merged result store")
+    args = parser.parse_args()
+    if args.participants and len(args.participants) != max(len(args.tracking), len(args.results), len(args.stores)):
+        parser.error("give one participants table per deployment, in the same order as the shards")
+    if args.participants and not args.stores:
+        # The merge renumbers participants, so an unmerged store would no longer match the table
+        parser.error(f"give each deployment's result store with --stores, so {args.stores_out} matches the merged IDs")
+    if args.stores and len(args.stores) != len(args.participants):
+        parser.error("give one participants table per result store, in the same order")
+    outputs = (
+        (args.results_out, args.results),
+        (args.tracking_out, args.tracking),
+        (args.participants_out, [path for path in args.participants if path != "-"]),
+        (args.stores_out, args.stores)
+    )
+    for output, inputs in outputs:
+        if os.path.abspath(output) in map(os.path.abspath, inputs):
+            parser.error(f"{output} is also an input; write the merge to a new file")
+    if args.stores and os.path.exists(args.stores_out):
+        # Checked before anything is written, so a refused run leaves no outputs behind
+        parser.error(f"{args.stores_out} already exists; write the merged store to a new file")
+
+    start = time.time()
+    registry, remaps = merge_participants(args.participants)
+    if args.results:
+        written, duplicates = merge_results(args.results, args.results_out, remaps)
+        print(f"Results: {written} participants from {len(args.results)} shards, {duplicates} duplicates dropped -> {args.results_out}")
+    if args.tracking:
+        try:
+            tracking = merge_tracking(args.tracking, args.tracking_out, registry, remaps)
+        except ValueError as e:
+            parser.error(str(e))
+        for folder, images in tracking.items():
+            counts = [data["shown_count"] for data in images.values()] or [0]
+            print(f"{folder}: {len(images)} images, shown {sum(counts)} times (min {min(counts)}, max {max(counts)} per image)")
+        print(f"Tracking -> {args.tracking_out}")
+    if args.stores:
+        try:
+            written, duplicates = merge_stores(args.stores, args.stores_out, remaps)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Result store: {written} records, {duplicates} duplicates dropped -> {args.stores_out}")
+    if args.tracking or args.participants:
+        registry.save(args.participants_out)
+        print(f"Participants: {len(registry)} -> {args.participants_out}")
+    print(f"Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+from datetime import date
+
+import streamlit as st
+import pandas as pd
+
+from quiz_api import API_HOST, API_PORT, SERVE_WITH_APP
+from quiz_manager import RESULTS_FILE
+from quiz_resources import admin_unlocked, current_study, get_profiler, get_quiz_manager
+from results_export import (
+    COMPRESSIONS, DASHBOARD_EXPORT_LIMIT, EXTENSIONS, MEDIA_TYPES, day_range, export_chunks, export_participants
+)
+from studies import DEFAULT_STUDY
+
+st.set_page_config(page_title="Researcher Dashboard", layout="wide")
+
+# Everything shown here comes from the shared in-memory aggregates, so the page
+# costs the same no matter how many participants have taken the quiz
+quiz_manager = get_quiz_manager(current_study())
+stats = quiz_manager.stats
+
+st.title("📊 Researcher Dashboard")
+
+if st.button("Refresh"):
+    st.rerun()
+
+st.subheader("Per Category")
+category_df = pd.DataFrame(stats.category_rows())
+if len(category_df) > 0:
+    total_exposures = int(category_df["exposures"].sum())
+    total_answered = int(category_df["answered"].sum())
+    col1, col2 = st.columns(2)
+    col1.metric("Images shown", total_exposures)
+    col2.metric("Answers recorded", total_answered)
+st.dataframe(category_df, hide_index=True, use_container_width=True)
+
+st.subheader("Per Image")
+folder = st.selectbox("Category:", [row["category"] for row in stats.category_rows()])
+if folder:
+    item_df = pd.DataFrame(stats.item_rows(folder))
+    st.dataframe(item_df, hide_index=True, use_container_width=True)
+    if len(item_df) > 0:
+        st.bar_chart(item_df.set_index("image")["exposures"])
+
+st.subheader("By Attribute")
+# Every combination of a category's annotation attributes is aggregated as answers
+# arrive, so each slice is read from counters kept up to date, not from the results
+folder = st.selectbox("Category:", [row["category"] for row in stats.category_rows()], key="attribute_category")
+fields = stats.attribute_fields(folder) if folder else []
+if fields:
+    selected = st.multiselect("Slice by:", fields, default=fields[:1])
+    if selected:
+        attribute_df = pd.DataFrame(stats.attribute_rows(folder, selected))
+        st.dataframe(attribute_df, hide_index=True, use_container_width=True)
+elif folder:
+    st.write("This category's annotations have no attributes to slice by.")
+
+# Profiling watches other participants' sessions and exports hold their names,
+# so the rest of the page needs the admin key
+st.subheader("Admin")
+if not admin_unlocked():
+    st.write("Profiling and exporting results need the admin key (QUIZ_ADMIN_KEY on the server).")
+    st.stop()
+
+st.subheader("Profiling")
+# Captures the quiz page's reruns as they happen; files go to the profiles directory
+profiler = get_profiler()
+status = profiler.status()
+col1, col2 = st.columns(2)
+reruns = col1.number_input("Reruns to profile:", min_value=1, value=20, step=1)
+participant = col2.text_input("Only this participant ID (optional):")
+if st.button("Start Profiling"):
+    profiler.arm(int(reruns), int(participant) if participant.strip().isdigit() else None)
+    st.rerun()
+if status["remaining"] > 0:
+    target = f" of participant {status['participant_id']}" if status["participant_id"] is not None else ""
+    st.write(f"Profiling the next {status['remaining']} reruns{target}.")
+    if st.button("Stop Profiling"):
+        profiler.disarm()
+        st.rerun()
+if status["written"]:
+    st.write(f"{len(status['written'])} captures (.prof for snakeviz/pstats, .collapsed for flame graphs):")
+    st.code("\n".join(os.path.basename(path) for path in status["written"][-20:]))
+
+st.subheader("Export Results")
+results_file = quiz_manager.study.path(RESULTS_FILE)
+if os.path.exists(results_file) and os.path.getsize(results_file) > DASHBOARD_EXPORT_LIMIT:
+    # A download is built whole in this process's memory, so large files are exported where they stream
+    st.write(f"The results file is {os.path.getsize(results_file) / 1e6:.0f} MB, too large to export here. "
+             "Export it on the server with:")
+    st.code(f"python results_export.py --results {results_file} --db {quiz_manager.results.path} "
+            "--since YYYY-MM-DD --category ...")
+    if SERVE_WITH_APP and quiz_manager.study.name == DEFAULT_STUDY:
+        st.write("or stream it from the API:")
+        st.code(f"curl -H 'X-Admin-Key: ...' -o results.csv.gz "
+                f"'http://{API_HOST}:{API_PORT}/admin/export?category=...&since=YYYY-MM-DD'")
+elif os.path.exists(results_file):
+    col1, col2 = st.columns(2)
+    days = col1.date_input("Completed between:", value=(), max_value=date.today())
+    categories = col2.multiselect("Categories (all if none):", quiz_manager.all_folders)
+    col1, col2 = st.columns(2)
+    participants = col1.text_input("Participant IDs, comma separated (all if empty):")
+    compression = col2.selectbox("Compression:", COMPRESSIONS)
+    participant_ids = [int(p) for p in participants.replace(" ", "").split(",") if p.isdigit()] or None
+    since, until = day_range(*(day.isoformat() for day in days)) if len(days) == 2 else (None, None)
+
+    def build_export():
+        # Runs only when the button is clicked; the file is read in chunks and compressed as it goes
+        return b"".join(export_chunks(
+            results_file, categories or None, export_participants(quiz_manager.results, since, until, participant_ids),
+            compression, quiz_manager.all_folders
+        ))
+
+    st.download_button("Download Results", build_export, file_name="results" + EXTENSIONS[compression],
+                       mime=MEDIA_TYPES[compression], on_click="ignore")
+    st.caption(f"Results file: {os.path.getsize(results_file) / 1e6:.1f} MB before filtering and compression.")
+else:
+    st.write("No results yet.")
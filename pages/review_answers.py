@@ -0,0 +1,71 @@
+import time
+
+import streamlit as st
+import pandas as pd
+
+from quiz_resources import admin_unlocked, current_study, get_quiz_manager
+
+st.set_page_config(page_title="Review Answers", layout="wide")
+
+quiz_manager = get_quiz_manager(current_study())
+catalog = quiz_manager.catalog
+
+st.title("📝 Review Answers")
+
+# A participant sees only their own record; looking up other IDs, which are
+# sequential, and the list of recent completions need the admin key
+own_id = st.session_state.get("user_id")
+with st.expander("Researchers"):
+    admin = admin_unlocked()
+if admin:
+    participant_id = st.number_input("Participant ID:", min_value=0, step=1, value=own_id if own_id is not None else 0)
+    record = quiz_manager.results.get(int(participant_id))
+else:
+    record = quiz_manager.results.get(own_id) if own_id is not None else None
+
+if record is None:
+    st.info("No completed quiz for this participant ID." if admin else "Your answers appear here once you complete the quiz.")
+    recent = quiz_manager.results.recent() if admin else []
+    if recent:
+        st.subheader("Recently Completed")
+        st.dataframe(
+            pd.DataFrame(
+                [(pid, name, time.strftime("%Y-%m-%d %H:%M", time.localtime(completed))) for pid, name, completed in recent],
+                columns=["participant_id", "name", "completed"]
+            ),
+            hide_index=True
+        )
+else:
+    rows = []
+    for n, item in enumerate(record["items"], 1):
+        # Items are stored by name, so they resolve against any version of the catalog
+        item_id = catalog.ids.get((item["folder"], item["img_name"]))
+        correct_letter = catalog.correct_letter(item_id) if item_id is not None else ""
+        rows.append({
+            "#": n,
+            "category": item["folder"],
+            "image": item["img_name"],
+            "answer": item["response"],
+            "correct_answer": correct_letter,
+            "correct": item["response"] == correct_letter,
+            "time": item["time"]
+        })
+    df = pd.DataFrame(rows)
+
+    st.write(f"**{record['name']}** ({record['age']}, {record['gender']}), completed "
+             f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(record['completed']))}")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Questions", len(df))
+    col2.metric("Accuracy", f"{df['correct'].mean() * 100:.1f}%" if len(df) else "-")
+    col3.metric("Average time", f"{df['time'].mean():.2f} s" if len(df) else "-")
+    st.dataframe(df, hide_index=True, use_container_width=True)
+
+    if st.checkbox("Show images and questions"):
+        for row in rows:
+            item_id = catalog.ids.get((row["category"], row["image"]))
+            if item_id is None:
+                continue
+            with st.expander(f"{row['#']}. {row['category']} - {row['image']}"):
+                st.image(quiz_manager.image_bytes(item_id), width=600)
+                st.write(catalog.questions[item_id])
+                st.write(f"Answer: {row['answer']} - Correct: {row['correct_answer']}")
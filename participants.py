@@ -0,0 +1,117 @@
+import csv
+import os
+import sys
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+
+PARTICIPANTS_FILE = "participants.csv"  # One row per participant: compact ID, unique key and metadata
+PARTICIPANT_FIELDS = ["id", "key", "name", "age", "gender", "started"]
+MAX_AGE = 0xFFFF  # Ages are kept in an unsigned 16-bit array
+
+
+class ParticipantRegistry:
+    """Participants addressed by compact integer IDs, numbered from 0 in registration order.
+
+    Exposure tracking stores only these integers; names and metadata live
+    once in this table. Each participant also has a globally unique key, so
+    tables from several deployments can be merged without ID collisions.
+    """
+
+    def __init__(self, path=PARTICIPANTS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.keys = []
+        self.names = []
+        self.ages = array("H")  # 0 if unknown
+        self.genders = []
+        self.started = array("d")
+        self.ids = {}  # key -> ID
+        if path is not None and os.path.exists(path):
+            with open(path, newline="") as f:
+                for row in csv.DictReader(f):
+                    self._add(row["key"], row["name"], row["age"], row["gender"], row["started"])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _add(self, key, name, age, gender, started):
+        # Every field is converted before anything is appended, so the parallel arrays stay aligned
+        age = int(age) if str(age).isdigit() else 0
+        age = age if age <= MAX_AGE else 0  # Out of range for the "H" array; kept as unknown
+        started = float(started) if started else 0.0
+        participant_id = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.ages.append(age)
+        self.genders.append(sys.intern(gender))
+        self.started.append(started)
+        self.ids[key] = participant_id
+        return participant_id
+
+    def register(self, name, age=0, gender="", key=None, started=None):
+        """ID of a new participant, or of the existing one with this key"""
+        key = key or uuid.uuid4().hex
+        started = time.time() if started is None else started
+        with self.lock:
+            if key in self.ids:
+                return self.ids[key]
+            participant_id = self._add(key, name, age, gender, started)
+            if self.path is not None:
+                new_file = not os.path.exists(self.path)
+                with open(self.path, 'a', newline="") as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(PARTICIPANT_FIELDS)
+                    writer.writerow([participant_id, key, name, age, gender, round(started, 3)])
+            return participant_id
+
+    def save(self, path):
+        """Write the whole table, e.g. after building a merged registry in memory"""
+        with open(path, 'w', newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(PARTICIPANT_FIELDS)
+            for participant_id in range(len(self.keys)):
+                row = self.get(participant_id)
+                writer.writerow([row[field] for field in PARTICIPANT_FIELDS])
+
+    def legacy_id(self, user_id):
+        """ID for an old "<name>_<unix time>" user string, registering it on first sight"""
+        if user_id in self.ids:
+            return self.ids[user_id]
+        name, _, started = user_id.rpartition("_")
+        if not started.isdigit():
+            name, started = user_id, None
+        return self.register(name, key=user_id, started=float(started) if started else 0.0)
+
+    def get(self, participant_id):
+        return {
+            "id": participant_id,
+            "key": self.keys[participant_id],
+            "name": self.names[participant_id],
+            "age": self.ages[participant_id] or "",
+            "gender": self.genders[participant_id],
+            "started": self.started[participant_id]
+        }
+
+
+def has_member(ids, participant_id):
+    """Whether a sorted ID array contains participant_id"""
+    i = bisect_left(ids, participant_id)
+    return i < len(ids) and ids[i] == participant_id
+
+
+def add_member(ids, participant_id):
+    """Insert participant_id into a sorted ID array; False if it was already there"""
+    i = bisect_left(ids, participant_id)
+    if i < len(ids) and ids[i] == participant_id:
+        return False
+    ids.insert(i, participant_id)
+    return True
+
+
+def member_array(users, registry):
+    """Sorted, duplicate-free ID array from a tracking list of IDs or legacy user strings"""
+    return array("I", sorted({u if isinstance(u, int) else registry.legacy_id(u) for u in users}))
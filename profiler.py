@@ -0,0 +1,155 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = "profiles"  # Where captures are written, as <time>_<phase>_<participant>.prof and .collapsed
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_RERUNS = int(os.environ.get("QUIZ_PROFILE_RERUNS", "0"))  # Reruns to profile from startup
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval, counting collapsed stacks.
+
+    The counts are in the "outer;inner count" format flame graph tools read.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+
+class Capture:
+    """cProfile and stack samples of one rerun, written to files when stopped"""
+
+    def __init__(self, phase, participant_id):
+        self.phase = phase
+        self.participant_id = participant_id
+        self.thread = threading.current_thread()
+        self.thread_id = self.thread.ident
+        self.started = time.time()
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(self.thread_id)
+
+    def start(self):
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self, directory):
+        """Write the .prof and .collapsed files; returns the path without extension"""
+        self.profile.disable()
+        self.sampler.stop()
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started)) + f"-{int(self.started * 1000) % 1000:03d}"
+        participant = "anonymous" if self.participant_id is None else f"p{self.participant_id}"
+        path = os.path.join(directory, f"{stamp}_{self.phase}_{participant}")
+        self.profile.dump_stats(path + ".prof")
+        with open(path + ".collapsed", 'w') as f:
+            for stack, count in self.sampler.counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class Profiler:
+    """Profiles the next N reruns, optionally only those of one participant.
+
+    Reruns call begin() with their phase (setup, calibration, question,
+    completion) and end() when they finish. One capture runs at a time, so
+    profiles of concurrent sessions never interleave.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, reruns=PROFILE_RERUNS):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.remaining = reruns
+        self.participant_id = None
+        self.current = None
+        self.written = []
+
+    def arm(self, reruns, participant_id=None):
+        with self.lock:
+            self.remaining = reruns
+            self.participant_id = participant_id
+
+    def disarm(self):
+        with self.lock:
+            self.remaining = 0
+            self.participant_id = None
+
+    def status(self):
+        with self.lock:
+            return {"remaining": self.remaining, "participant_id": self.participant_id, "written": list(self.written)}
+
+    def begin(self, phase, participant_id=None):
+        """Start capturing this rerun if the profiler is armed for it"""
+        # A rerun cut short by st.rerun() never reaches end(); its capture closes here
+        self.end()
+        self._close_orphan()
+        with self.lock:
+            if self.remaining <= 0 or self.current is not None:
+                return
+            if self.participant_id is not None and participant_id != self.participant_id:
+                return
+            self.remaining -= 1
+            capture = self.current = Capture(phase, participant_id)
+        capture.start()
+
+    def end(self):
+        """Stop this thread's capture, if any, and write its files"""
+        with self.lock:
+            capture = self.current
+            if capture is None or capture.thread_id != threading.get_ident():
+                return
+            self.current = None
+        path = capture.stop(self.directory)
+        with self.lock:
+            self.written.append(path)
+
+    def _close_orphan(self):
+        """Close a capture whose rerun thread died before end(), e.g. on disconnect or an uncaught error"""
+        with self.lock:
+            capture = self.current
+            if capture is None or capture.thread.is_alive():
+                return
+            self.current = None
+        path = capture.stop(self.directory)
+        with self.lock:
+            self.written.append(path)
+
+    @contextmanager
+    def capture(self, phase, participant_id=None):
+        """Profile a block, such as a fragment rerun, ending it however the block exits"""
+        current = self.current
+        if current is not None and current.thread_id == threading.get_ident():
+            # Already inside this thread's capture, e.g. a fragment drawn by a full rerun
+            yield
+            return
+        self.begin(phase, participant_id)
+        try:
+            yield
+        finally:
+            self.end()
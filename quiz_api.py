@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import math
+import os
+import secrets
+import threading
+import time
+from array import array
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from admin import is_admin_key
+from quiz_manager import ADAPTIVE_MODE, RESULTS_FILE, normalize_answer
+from results_export import COMPRESSIONS, EXTENSIONS, MEDIA_TYPES, day_range, export_chunks, export_participants
+
+API_HOST = "127.0.0.1"
+API_PORT = 8600
+SERVE_WITH_APP = False  # Also serve the API from the Streamlit process, sharing its QuizManager
+MAX_AGE = 120  # Oldest age accepted, as in the app's age field
+SESSION_TTL = 3 * 60 * 60  # Seconds of inactivity after which an unfinished session is dropped
+MAX_ANSWER_SECONDS = SESSION_TTL  # Longest answer time accepted; a session idle longer is gone anyway
+
+
+class ApiSession:
+    """One participant's quiz as the API holds it: the pinned snapshot and compact answer arrays"""
+
+    __slots__ = ("token", "participant_id", "user_data", "snapshot", "order", "responses", "times", "adaptive", "last_seen", "lock", "completed")
+
+    def __init__(self, participant_id, user_data, snapshot):
+        # Participant IDs are sequential, so sessions are addressed by an unguessable token instead
+        self.token = secrets.token_urlsafe(24)
+        self.participant_id = participant_id
+        self.user_data = user_data
+        self.snapshot = snapshot
+        self.order = snapshot.catalog.new_order()
+        self.responses = array("b")
+        self.times = array("f")
+        self.adaptive = snapshot.adaptive.new_state() if ADAPTIVE_MODE else None
+        self.last_seen = time.monotonic()
+        # Serializes a participant's answers while an adaptive pick runs in the thread pool
+        self.lock = asyncio.Lock()
+        self.completed = False  # Kept until it expires, so a retried /complete gets the summary again
+
+    def pending(self):
+        """Item ID of the question awaiting an answer, or None when all are answered"""
+        if len(self.responses) < len(self.order):
+            return self.order[len(self.responses)]
+        return None
+
+
+def item_json(catalog, item_id, image_url):
+    """What a client needs to show an item; answer keys stay on the server"""
+    return {
+        "id": item_id,
+        "folder": catalog.folder_of(item_id),
+        "question": catalog.questions[item_id],
+        "options": catalog.options(item_id),
+        "image": image_url
+    }
+
+
+class QuizApi:
+    """HTTP/JSON front end over a QuizManager.
+
+    Handlers run on one asyncio event loop; QuizManager calls, which take
+    its lock and write the tracking and results files, run in the thread
+    pool so a slow write never stalls other participants. Sessions are
+    created, answered and completed with the same semantics as the
+    Streamlit app, and can share its manager.
+    """
+
+    def __init__(self, quiz_manager, session_ttl=SESSION_TTL):
+        self.quiz_manager = quiz_manager
+        self.session_ttl = session_ttl
+        self.sessions = {}  # session token -> ApiSession
+        self.app = Starlette(routes=[
+            Route("/catalog", self.catalog, methods=["GET"]),
+            Route("/calibration/{n:int}/image", self.calibration_image, methods=["GET"]),
+            Route("/sessions", self.create_session, methods=["POST"]),
+            Route("/sessions/{token}", self.get_session, methods=["GET"]),
+            Route("/sessions/{token}/items/{n:int}/image", self.item_image, methods=["GET"]),
+            Route("/sessions/{token}/answers", self.submit_answer, methods=["POST"]),
+            Route("/sessions/{token}/complete", self.complete, methods=["POST"]),
+            Route("/admin/export", self.export, methods=["GET"])
+        ])
+
+    def _session(self, request):
+        session = self.sessions.get(request.path_params["token"])
+        if session is not None:
+            session.last_seen = time.monotonic()
+        return session
+
+    def _expire_sessions(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for token in [token for token, session in self.sessions.items() if session.last_seen < cutoff]:
+            del self.sessions[token]
+
+    def _session_json(self, session):
+        catalog = session.snapshot.catalog
+        token = session.token
+        return {
+            "participant_id": session.participant_id,
+            "token": token,
+            "items": [item_json(catalog, item_id, f"/sessions/{token}/items/{n}/image") for n, item_id in enumerate(session.order)],
+            "answered": len(session.responses),
+            "adaptive": ADAPTIVE_MODE
+        }
+
+    async def catalog(self, request):
+        snapshot = self.quiz_manager.snapshot
+        catalog = snapshot.catalog
+        calibration = []
+        for n, item_id in enumerate(snapshot.calibration_order):
+            item = item_json(catalog, item_id, f"/calibration/{n}/image")
+            # Calibration is practice, so its answers are shown to participants anyway
+            item["answer"] = normalize_answer(catalog.answers[item_id])
+            calibration.append(item)
+        return JSONResponse({"folders": catalog.folders, "items": len(catalog), "calibration": calibration})
+
+    async def calibration_image(self, request):
+        snapshot = self.quiz_manager.snapshot
+        n = request.path_params["n"]
+        if n >= len(snapshot.calibration_order):
+            return JSONResponse({"error": "no such calibration item"}, status_code=404)
+        data = await run_in_threadpool(snapshot.image_bytes, snapshot.calibration_order[n])
+        return Response(data, media_type="image/png", headers={"Cache-Control": "private, max-age=3600"})
+
+    @staticmethod
+    async def _json_object(request):
+        """The request body as a dict, or None if it is not a JSON object"""
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    async def create_session(self, request):
+        body = await self._json_object(request)
+        if body is None:
+            return JSONResponse({"error": "body must be a JSON object"}, status_code=400)
+        name = str(body.get("name", "")).strip()
+        if not name:
+            return JSONResponse({"error": "name is required"}, status_code=400)
+        age = body.get("age", "")
+        if age != "" and (not isinstance(age, int) or isinstance(age, bool) or not 1 <= age <= MAX_AGE):
+            return JSONResponse({"error": f"age must be a whole number from 1 to {MAX_AGE}"}, status_code=400)
+        user_data = {"name": name, "age": age, "gender": str(body.get("gender", ""))}
+        self._expire_sessions()
+
+        def start():
+            participant_id = self.quiz_manager.register_participant(user_data["name"], user_data["age"], user_data["gender"])
+            session = ApiSession(participant_id, user_data, self.quiz_manager.snapshot)
+            if ADAPTIVE_MODE:
+                self.quiz_manager.next_adaptive_item(participant_id, session.adaptive, session.order, session.snapshot)
+            else:
+                session.order = self.quiz_manager.get_items_for_user(participant_id, session.snapshot)
+            return session
+
+        session = await run_in_threadpool(start)
+        self.sessions[session.token] = session
+        return JSONResponse(self._session_json(session), status_code=201)
+
+    async def get_session(self, request):
+        session = self._session(request)
+        if session is None:
+            return JSONResponse({"error": "no such session"}, status_code=404)
+        return JSONResponse(self._session_json(session))
+
+    async def item_image(self, request):
+        session = self._session(request)
+        n = request.path_params["n"]
+        if session is None or n >= len(session.order):
+            return JSONResponse({"error": "no such item"}, status_code=404)
+        data = await run_in_threadpool(session.snapshot.image_bytes, session.order[n])
+        return Response(data, media_type="image/png", headers={"Cache-Control": "private, max-age=3600"})
+
+    async def submit_answer(self, request):
+        """Record the answer to the pending question; in adaptive mode the reply carries the next one"""
+        session = self._session(request)
+        if session is None:
+            return JSONResponse({"error": "no such session"}, status_code=404)
+        body = await self._json_object(request)
+        if body is None:
+            return JSONResponse({"error": "body must be a JSON object"}, status_code=400)
+        async with session.lock:
+            return await self._record_answer(session, body)
+
+    async def _record_answer(self, session, body):
+        item_id = session.pending()
+        catalog = session.snapshot.catalog
+        if item_id is None or body.get("item_id") != item_id:
+            return JSONResponse({"error": "not the pending question", "pending": item_id}, status_code=409)
+        response = body.get("response")
+        seconds = body.get("time")
+        if not isinstance(response, int) or isinstance(response, bool) or not 0 <= response < len(catalog.options(item_id)):
+            return JSONResponse({"error": "response must be an option index"}, status_code=400)
+        # NaN or inf would poison the running stats and sketches, and persist in the saved results
+        if (not isinstance(seconds, (int, float)) or isinstance(seconds, bool) or not math.isfinite(seconds)
+                or not 0 <= seconds <= MAX_ANSWER_SECONDS):
+            return JSONResponse({"error": f"time must be a number of seconds from 0 to {MAX_ANSWER_SECONDS}"}, status_code=400)
+        session.responses.append(response)
+        session.times.append(round(seconds, 2))
+
+        reply = {"answered": len(session.responses), "next": None}
+        if ADAPTIVE_MODE:
+            session.snapshot.adaptive.update(session.adaptive, item_id, catalog.is_correct(item_id, response))
+            next_id = await run_in_threadpool(
+                self.quiz_manager.next_adaptive_item, session.participant_id, session.adaptive, session.order, session.snapshot
+            )
+            if next_id is not None:
+                n = len(session.order) - 1
+                reply["next"] = item_json(catalog, next_id, f"/sessions/{session.token}/items/{n}/image")
+        elif session.pending() is not None:
+            n = len(session.responses)
+            reply["next"] = item_json(catalog, session.pending(), f"/sessions/{session.token}/items/{n}/image")
+        return JSONResponse(reply)
+
+    async def complete(self, request):
+        """Save the session's results (once, keyed by participant ID) and return the summary.
+
+        Retried or concurrent calls return the same summary with saved false.
+        """
+        session = self._session(request)
+        if session is None:
+            return JSONResponse({"error": "no such session"}, status_code=404)
+        async with session.lock:
+            if session.pending() is not None:
+                return JSONResponse({"error": "questions remain", "answered": len(session.responses)}, status_code=409)
+            saved = False
+            if not session.completed:
+                saved = await run_in_threadpool(
+                    self.quiz_manager.save_user_results,
+                    session.user_data, session.order, session.responses, session.times,
+                    session.snapshot.catalog, session.participant_id
+                )
+                session.completed = True
+        return JSONResponse(self._summary(session, saved))
+
+    def _summary(self, session, saved):
+        """Score of a completed session, by folder"""
+        catalog = session.snapshot.catalog
+        folders = {}
+        for item_id, response in zip(session.order, session.responses):
+            stats = folders.setdefault(catalog.folder_of(item_id), {"correct": 0, "total": 0})
+            stats["total"] += 1
+            stats["correct"] += catalog.is_correct(item_id, response)
+        return {
+            "saved": saved,
+            "correct": sum(stats["correct"] for stats in folders.values()),
+            "total": len(session.order),
+            "folders": folders,
+            "avg_time": sum(session.times) / len(session.times) if session.times else 0.0
+        }
+
+    async def export(self, request):
+        """Stream the results CSV, filtered and compressed, to an admin.
+
+        [?since=YYYY-MM-DD][&until=YYYY-MM-DD][&category=...][&participant=...][&compression=gzip]
+        with the header X-Admin-Key: <QUIZ_ADMIN_KEY>; category and participant may repeat.
+        The key is not taken from the URL, which access logs and shell history keep. Chunks are produced in the thread
+        pool as the client reads them, so a large export holds one chunk in
+        memory and never blocks the event loop.
+        """
+        params = request.query_params
+        if not is_admin_key(request.headers.get("x-admin-key")):
+            return JSONResponse({"error": "admin key required"}, status_code=403)
+        compression = params.get("compression", "gzip")
+        if compression not in COMPRESSIONS:
+            return JSONResponse({"error": f"compression must be one of {', '.join(COMPRESSIONS)}"}, status_code=400)
+        participants = params.getlist("participant")
+        if not all(p.isdigit() for p in participants):
+            return JSONResponse({"error": "participant must be an ID"}, status_code=400)
+        try:
+            since, until = day_range(params.get("since"), params.get("until"))
+        except ValueError:
+            return JSONResponse({"error": "since and until must be YYYY-MM-DD"}, status_code=400)
+
+        results_file = self.quiz_manager.study.path(RESULTS_FILE)
+        if not os.path.exists(results_file):
+            return JSONResponse({"error": "no results yet"}, status_code=404)
+        participant_ids = await run_in_threadpool(
+            export_participants, self.quiz_manager.results, since, until, [int(p) for p in participants] or None
+        )
+        chunks = export_chunks(results_file, params.getlist("category") or None, participant_ids,
+                               compression, self.quiz_manager.all_folders)
+        file_name = "results" + EXTENSIONS[compression]
+        return StreamingResponse(chunks, media_type=MEDIA_TYPES[compression],
+                                 headers={"Content-Disposition": f'attachment; filename="{file_name}"'})
+
+
+def serve(quiz_manager, host=API_HOST, port=API_PORT):
+    """Run the API on the current thread until interrupted"""
+    # One event loop serves every connection; HTTP keep-alive lets clients reuse theirs
+    uvicorn.run(QuizApi(quiz_manager).app, host=host, port=port, log_level="warning", timeout_keep_alive=30)
+
+
+def serve_in_thread(quiz_manager, host=API_HOST, port=API_PORT):
+    """Run the API beside the Streamlit app, on its own thread and event loop, sharing its manager"""
+    server = uvicorn.Server(uvicorn.Config(QuizApi(quiz_manager).app, host=host, port=port, log_level="warning", timeout_keep_alive=30))
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve()), name="quiz-api", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    from quiz_manager import QuizManager
+    from studies import DEFAULT_STUDY, load_studies
+
+    parser = argparse.ArgumentParser(description="Serve the quiz as an HTTP/JSON API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--study", default=DEFAULT_STUDY, help="Study to serve, from studies.json")
+    args = parser.parse_args()
+
+    studies = load_studies()
+    if args.study not in studies:
+        parser.error(f"unknown study {args.study}")
+    quiz_manager = QuizManager(studies[args.study])
+    quiz_manager.start_watcher()
+    print(f"Quiz API on http://{args.host}:{args.port}")
+    serve(quiz_manager, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
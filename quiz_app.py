@@ -3,6 +3,7 @@ import json
 import os
 import csv
 import time
+import uuid
 
 st.set_page_config(page_title="Perception Quiz", layout="wide")
 
@@ -12,6 +13,42 @@ root_dir = r"D:\Perception_dataset\Dataset_humanEval"
 # Variable to control how many images per folder
 max_per_folder = 2
 
+
+@st.cache_data
+def load_folder_questions(folder, folder_path, cache_key):
+    """Questions of one folder; cache_key changes when files are added or annotations edited, so only changed folders are re-read"""
+    folder_questions = []
+    json_path = os.path.join(folder_path, "annotations.json")
+    if os.path.exists(json_path):
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        count = 0
+        for img_name, info in data.items():
+            if count >= max_per_folder:
+                break
+            img_path = os.path.join(folder_path, img_name)
+            if os.path.exists(img_path):
+                question_text = info.get("question", "")
+                if isinstance(question_text, list):
+                    question_text = question_text[0]
+                answer = info.get("answer", "")
+                folder_questions.append({
+                    "folder": folder,
+                    "img_path": img_path,
+                    "question": question_text,
+                    "answer": answer
+                })
+                count += 1
+    return folder_questions
+
+
+def folder_cache_key(folder_path):
+    """Modification times of the folder (files added or removed) and of its annotations"""
+    json_path = os.path.join(folder_path, "annotations.json")
+    json_mtime = os.stat(json_path).st_mtime_ns if os.path.exists(json_path) else None
+    return os.stat(folder_path).st_mtime_ns, json_mtime
+
+
 # Collect all folders and questions
 all_folders = set()
 questions = []
@@ -19,27 +56,7 @@ for folder in os.listdir(root_dir):
     folder_path = os.path.join(root_dir, folder)
     if os.path.isdir(folder_path):
         all_folders.add(folder)
-        json_path = os.path.join(folder_path, "annotations.json")
-        if os.path.exists(json_path):
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-            count = 0
-            for img_name, info in data.items():
-                if count >= max_per_folder:
-                    break
-                img_path = os.path.join(folder_path, img_name)
-                if os.path.exists(img_path):
-                    question_text = info.get("question", "")
-                    if isinstance(question_text, list):
-                        question_text = question_text[0]
-                    answer = info.get("answer", "")
-                    questions.append({
-                        "folder": folder,
-                        "img_path": img_path,
-                        "question": question_text,
-                        "answer": answer
-                    })
-                    count += 1
+        questions.extend(load_folder_questions(folder, folder_path, folder_cache_key(folder_path)))
 
 # Streamlit app
 if "setup_done" not in st.session_state:
@@ -65,17 +82,25 @@ if not st.session_state.setup_done:
         st.session_state.age = age
         st.session_state.gender = gender
         st.session_state.setup_done = True
+        # Keep this participant's questions fixed even if annotations change mid-quiz
+        st.session_state.questions = questions
+        # Identifies this attempt, so its results are written exactly once
+        st.session_state.attempt_id = uuid.uuid4().hex
         st.session_state.current_question = 0
         st.session_state.answers = []
         st.session_state.scores = []
         st.rerun()
 else:
+    if "questions" in st.session_state:
+        questions = st.session_state.questions
     if "current_question" not in st.session_state:
         st.session_state.current_question = 0
     if "answers" not in st.session_state:
         st.session_state.answers = []
     if "scores" not in st.session_state:
         st.session_state.scores = []
+    if "attempt_id" not in st.session_state:
+        st.session_state.attempt_id = uuid.uuid4().hex
 
     if st.session_state.current_question < len(questions):
         q = questions[st.session_state.current_question]
@@ -106,30 +131,32 @@ else:
             accuracy = (folder_scores[folder] / folder_counts[folder]) * 100
             st.write(f"{folder}: {accuracy:.2f}%")
             print(f"{folder}: {accuracy:.2f}%")  # Print to terminal
-        # Save results
-        lock_file = "results.lock"
-        while os.path.exists(lock_file):
-            time.sleep(0.1)
-        with open(lock_file, 'w') as lf:
-            lf.write("locked")
-        try:
-            if not os.path.exists("results.csv"):
-                header = ["name", "age", "gender"] + sorted(all_folders)
-                with open("results.csv", "w", newline="") as f:
+        # Save results once per attempt; reruns of the completion page write nothing
+        if st.session_state.get("saved_attempt") != st.session_state.attempt_id:
+            lock_file = "results.lock"
+            while os.path.exists(lock_file):
+                time.sleep(0.1)
+            with open(lock_file, 'w') as lf:
+                lf.write("locked")
+            try:
+                if not os.path.exists("results.csv"):
+                    header = ["name", "age", "gender"] + sorted(all_folders)
+                    with open("results.csv", "w", newline="") as f:
+                        writer = csv.writer(f)
+                        writer.writerow(header)
+                row = [st.session_state.name, st.session_state.age, st.session_state.gender]
+                for folder in sorted(all_folders):
+                    if folder in folder_scores:
+                        accuracy = (folder_scores[folder] / folder_counts[folder]) * 100
+                    else:
+                        accuracy = 0
+                    row.append(accuracy)
+                with open("results.csv", "a", newline="") as f:
                     writer = csv.writer(f)
-                    writer.writerow(header)
-            row = [st.session_state.name, st.session_state.age, st.session_state.gender]
-            for folder in sorted(all_folders):
-                if folder in folder_scores:
-                    accuracy = (folder_scores[folder] / folder_counts[folder]) * 100
-                else:
-                    accuracy = 0
-                row.append(accuracy)
-            with open("results.csv", "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(row)
-        finally:
-            os.remove(lock_file)
+                    writer.writerow(row)
+                st.session_state.saved_attempt = st.session_state.attempt_id
+            finally:
+                os.remove(lock_file)
         st.write("Results recorded")
         # Reset
         if st.button("Restart Quiz"):
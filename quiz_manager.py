@@ -0,0 +1,752 @@
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from array import array
+
+import pandas as pd
+
+from adaptive import AdaptiveEngine, load_item_params
+from attributes import folder_attributes
+from assignment_planner import ASSIGNMENT_PLAN_FILE, PLAN_CURSOR_FILE, AssignmentPlan
+from image_cache import WARMUP_WORKERS, ImageCache, print_progress
+from participants import PARTICIPANTS_FILE, ParticipantRegistry, add_member, has_member, member_array
+from quiz_stats import LiveStats
+from results_store import RESULTS_DB, ResultStore
+
+# Root directory
+root_dir = r"./"
+
+# Configuration
+IMAGES_PER_FOLDER = 5  # Number of images each user sees per folder
+TRACKING_FILE = "user_image_tracking.json"  # File to track which images have been shown to which users
+RESULTS_FILE = "detailed_results.csv"  # CSV file for storing detailed results
+RT_SKETCH_FILE = "rt_sketches.json"  # Mergeable response time quantile sketches per category and image
+ADAPTIVE_MODE = False  # Pick each next question by maximum information instead of a fixed set per folder
+BUNDLE_MODE = False  # Run the test in the browser from one download and save the answers in one batch (not with ADAPTIVE_MODE)
+WARMUP_IMAGES = False  # Decode and verify every image at startup; images that fail are never assigned
+RELOAD_INTERVAL = 5  # Seconds between checks for changed annotations or images; 0 disables hot reload
+ANSWER_KEY = {
+    "abstract":"answer",
+    "dynamic_isomorph":"fifth_label",
+    "hierarchial_isomorph": "answer",
+    "mental_composition": "answer",
+    "mental_rotation" : "answer",
+    "paper_folding":"correct_option",
+    "slippage":"violation",
+    "symmetric_isomorph":"asymmetric_label"
+}
+DEFAULT_ANSWER_FIELD = "answer"  # Answer field of folders missing from ANSWER_KEY, such as ones added while running
+
+# Answer options shown per folder; responses are stored as an index into OPTION_LABELS
+OPTION_LABELS = "ABCDEF"
+SIX_OPTION_FOLDERS = ["abstract", "slippage"]
+SIX_OPTIONS = ["A", "B", "C", "D", "E", "F"]
+FOUR_OPTIONS = ["A", "B", "C", "D"]
+NO_RESPONSE = -1
+
+
+def options_for_folder(folder):
+    """Answer options offered for questions of a folder"""
+    if folder in SIX_OPTION_FOLDERS:
+        # Format like "A", "B", "C", "D"
+        return SIX_OPTIONS
+    # Default fallback
+    return FOUR_OPTIONS
+
+
+def normalize_answer(answer):
+    """Turn an annotation answer like "(d)" or "b" into its option letter"""
+    return answer.strip().strip("()").upper()
+
+
+def image_base(img_name):
+    """Image name without extension, as used in CSV column names"""
+    return img_name.replace('.png', '').replace('.jpg', '').replace('.jpeg', '')
+
+
+def get_all_folders(root):
+    """Get all folders under root that contain annotations.json"""
+    folders = []
+    for folder in os.listdir(root):
+        folder_path = os.path.join(root, folder)
+        if os.path.isdir(folder_path):
+            json_path = os.path.join(folder_path, "annotations.json")
+            if os.path.exists(json_path):
+                folders.append(folder)
+    return sorted(folders)
+
+
+def load_folder_images(root, folder, answer_key=None):
+    """Load the images of one folder that exist on disk, with their question and answer"""
+    answer_key = ANSWER_KEY if answer_key is None else answer_key
+    folder_path = os.path.join(root, folder)
+    json_path = os.path.join(folder_path, "annotations.json")
+
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+
+    answer_field = answer_key.get(folder)
+    if answer_field is None:
+        print(f"Warning: {folder} has no entry in ANSWER_KEY; reading answers from \"{DEFAULT_ANSWER_FIELD}\"")
+        answer_field = DEFAULT_ANSWER_FIELD
+    folder_images = {}
+    for img_name, info in data.items():
+        img_path = os.path.join(folder_path, img_name)
+        if os.path.exists(img_path):
+            question_text = info.get("question", "")
+            if isinstance(question_text, list):
+                question_text = question_text[0]
+
+            folder_images[img_name] = {
+                "img_path": img_path,
+                "question": sys.intern(question_text),
+                "answer": info.get(answer_field, "")
+            }
+
+    return folder_images
+
+
+def folder_signature(folder_path):
+    """Names, sizes and modification times of a folder's files; changes whenever any of them does"""
+    if not os.path.isdir(folder_path):
+        return frozenset()
+    signature = set()
+    for entry in os.scandir(folder_path):
+        if entry.is_file():
+            stat = entry.stat()
+            signature.add((entry.name, stat.st_mtime_ns, stat.st_size))
+    return frozenset(signature)
+
+
+def load_catalog(root=None):
+    """Build the item catalog on its own, without tracking data (for batch tools)"""
+    root = root_dir if root is None else root
+    folders = get_all_folders(root)
+    return Catalog(folders, {folder: load_folder_images(root, folder) for folder in folders})
+
+
+class Catalog:
+    """Shared, read-only table of all quiz items addressed by compact integer IDs.
+
+    Sessions only keep arrays of item IDs; display data is looked up here.
+    Strings are interned so repeated question texts are stored once.
+    """
+
+    def __init__(self, folders, all_images):
+        self.folders = list(folders)
+        total = sum(len(all_images[folder]) for folder in self.folders)
+        self.typecode = "H" if total <= 0xFFFF else "I"
+
+        self.item_folder = array("H")
+        self.img_names = []
+        self.img_paths = []
+        self.questions = []
+        self.answers = []
+        self.correct = array("b")  # Index of the correct option, NO_RESPONSE if not a letter
+        self.column_prefixes = []
+        self.ids = {}  # (folder, img_name) -> item ID
+        self.folder_ids = {}
+
+        for folder_index, folder in enumerate(self.folders):
+            ids = self.new_order()
+            for img_name, img_data in all_images[folder].items():
+                item_id = len(self.img_names)
+                letter = normalize_answer(img_data["answer"])
+                self.item_folder.append(folder_index)
+                self.img_names.append(sys.intern(img_name))
+                self.img_paths.append(img_data["img_path"])
+                self.questions.append(sys.intern(img_data["question"]))
+                self.answers.append(sys.intern(img_data["answer"]))
+                self.correct.append(OPTION_LABELS.find(letter) if len(letter) == 1 else NO_RESPONSE)
+                self.column_prefixes.append(sys.intern(f"{folder}_{image_base(img_name)}"))
+                self.ids[(folder, img_name)] = item_id
+                ids.append(item_id)
+            self.folder_ids[folder] = ids
+
+    def __len__(self):
+        return len(self.img_names)
+
+    def new_order(self, ids=()):
+        """Create a compact array of item IDs"""
+        return array(self.typecode, ids)
+
+    def folder_of(self, item_id):
+        return self.folders[self.item_folder[item_id]]
+
+    def item(self, item_id):
+        """Display data for one item, in the shape the quiz pages use"""
+        return {
+            "folder": self.folder_of(item_id),
+            "img_name": self.img_names[item_id],
+            "img_path": self.img_paths[item_id],
+            "question": self.questions[item_id],
+            "answer": self.answers[item_id]
+        }
+
+    def options(self, item_id):
+        return options_for_folder(self.folder_of(item_id))
+
+    def correct_letter(self, item_id):
+        correct = self.correct[item_id]
+        return OPTION_LABELS[correct] if correct != NO_RESPONSE else ""
+
+    def is_correct(self, item_id, response):
+        return response != NO_RESPONSE and response == self.correct[item_id]
+
+    def order_for(self, selected_images):
+        """Item IDs for a {folder: [img_name, ...]} selection, in folder order"""
+        order = self.new_order()
+        for folder in self.folders:
+            for img_name in selected_images.get(folder, []):
+                order.append(self.ids[(folder, img_name)])
+        return order
+
+
+class Study:
+    """One study's stimuli, settings and data files.
+
+    The default study is this module's configuration with its files in the
+    working directory; studies.py loads more from studies.json.
+    """
+
+    __slots__ = ("name", "root_dir", "data_dir", "images_per_folder", "answer_key")
+
+    def __init__(self, name, root, data_dir=".", images_per_folder=None, answer_key=None):
+        self.name = name
+        self.root_dir = root
+        self.data_dir = data_dir
+        self.images_per_folder = IMAGES_PER_FOLDER if images_per_folder is None else images_per_folder
+        # Overrides are per folder; folders not mentioned keep the default answer field
+        self.answer_key = ANSWER_KEY if answer_key is None else {**ANSWER_KEY, **answer_key}
+
+    @classmethod
+    def default(cls):
+        return cls("default", root_dir)
+
+    def path(self, filename):
+        """Where this study keeps one of its data files"""
+        return os.path.join(self.data_dir, filename)
+
+
+class SharedCaches:
+    """Parsed folders, catalogs and display images shared by the studies of one process.
+
+    Folders are keyed by their path, answer field and file signature, and
+    catalogs by the keys of their folders, so studies over the same stimuli
+    hold one copy of each. Display images are stored by content hash (see
+    ImageCache), so a stimulus copied into several studies is decoded once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images = ImageCache()
+        self._folders = {}  # folder key -> {img_name: info}
+        self._catalogs = {}  # tuple of folder keys -> Catalog
+
+    @staticmethod
+    def folder_key(root, folder, answer_key, signature):
+        return (os.path.abspath(os.path.join(root, folder)), answer_key.get(folder, DEFAULT_ANSWER_FIELD), signature)
+
+    def folder_images(self, root, folder, answer_key, signature):
+        """A folder's images as load_folder_images returns them, parsed once per version"""
+        key = self.folder_key(root, folder, answer_key, signature)
+        folder_images = self._folders.get(key)
+        if folder_images is not None:
+            return folder_images
+        folder_images = load_folder_images(root, folder, answer_key)
+        with self.lock:
+            # Older versions of the folder stay with the snapshots using them, not here
+            for stale in [k for k in self._folders if k[:2] == key[:2] and k != key]:
+                del self._folders[stale]
+            return self._folders.setdefault(key, folder_images)
+
+    def catalog(self, root, answer_key, signatures, all_images):
+        """The Catalog of these folders, built once for every study that has the same ones"""
+        folders = sorted(all_images)
+        key = tuple(self.folder_key(root, folder, answer_key, signatures[folder]) for folder in folders)
+        catalog = self._catalogs.get(key)
+        if catalog is not None:
+            return catalog
+        catalog = Catalog(folders, all_images)
+        with self.lock:
+            for stale in [k for k in self._catalogs if not all(folder in self._folders for folder in k)]:
+                del self._catalogs[stale]
+            return self._catalogs.setdefault(key, catalog)
+
+
+class DatasetSnapshot:
+    """One version of the dataset: the catalog and everything derived from it.
+
+    A reload builds a new snapshot and swaps it in with a single assignment.
+    Sessions keep a reference to the snapshot they started on, so their item
+    IDs, answer keys and images stay valid however the dataset changes.
+    """
+
+    __slots__ = ("catalog", "adaptive", "calibration_order", "images")
+
+    def __init__(self, catalog, adaptive, calibration_order, images):
+        self.catalog = catalog
+        self.adaptive = adaptive
+        self.calibration_order = calibration_order
+        self.images = images
+
+    def image_bytes(self, item_id):
+        """Encoded display image for an item"""
+        return self.images.get(self.catalog.img_paths[item_id])
+
+
+class QuizManager:
+    def __init__(self, study=None, shared=None):
+        # One manager per study is shared by all its sessions, so assignment must be serialized
+        self.lock = threading.Lock()
+        self.study = study or Study.default()
+        # Managers of several studies in one process pass the same caches
+        self.shared = shared or SharedCaches()
+        root = self.study.root_dir
+        self.all_folders = self._get_all_folders()
+        self.signatures = {folder: folder_signature(os.path.join(root, folder)) for folder in self.all_folders}
+        self.all_images = self._load_all_images()
+        self.item_params = {folder: load_item_params(os.path.join(root, folder)) for folder in self.all_folders}
+        catalog = self.shared.catalog(root, self.study.answer_key, self.signatures, self.all_images)
+        # Display-size image bytes; the optional warmup fills it before anyone is assigned.
+        # The manager's own view of the shared store, so its old versions are freed as snapshots move on
+        images = self.shared.images.without(())
+        self.failed_images = set()  # (folder, img_name) of images that could not be decoded
+        if WARMUP_IMAGES:
+            self.failed_images = self._warmup(images, catalog, range(len(catalog)))
+        self.snapshot = self._make_snapshot(catalog, images, self.failed_images)
+        # Participants get compact integer IDs; tracking stores those in sorted arrays
+        self.participants = ParticipantRegistry(self.study.path(PARTICIPANTS_FILE))
+        self.tracking_data = self._load_tracking_data()
+        # Completed quizzes by participant ID, for review and lookup without scanning the CSV
+        self.results = ResultStore(self.study.path(RESULTS_DB))
+        if self.results.max_id() >= len(self.participants):
+            # e.g. a merged participants table deployed beside an unmerged store
+            print(f"Warning: {self.results.path} has records for participant IDs not in the participants table; "
+                  f"new participants would collide with them (see merge_results.py --stores)")
+        self.stats = self._load_stats()
+        # Precomputed balanced blocks (see assignment_planner.py); None means greedy assignment
+        self.plan = AssignmentPlan.load(self.study.path(ASSIGNMENT_PLAN_FILE), self.study.path(PLAN_CURSOR_FILE))
+        self._watcher = None
+        self._failed_signatures = {}  # folder -> signature of the version that failed to reload
+
+    # The current snapshot's parts, for callers that do not pin a snapshot
+    @property
+    def catalog(self):
+        return self.snapshot.catalog
+
+    @property
+    def adaptive(self):
+        return self.snapshot.adaptive
+
+    @property
+    def calibration_order(self):
+        return self.snapshot.calibration_order
+
+    @property
+    def images(self):
+        return self.snapshot.images
+
+    def _make_snapshot(self, catalog, images, failed_images):
+        adaptive = AdaptiveEngine(catalog, self.item_params, max_items=self.study.images_per_folder)
+        calibration_order = catalog.order_for(self._calibration_images(catalog, failed_images))
+        return DatasetSnapshot(catalog, adaptive, calibration_order, images)
+
+    def _warmup(self, images, catalog, item_ids, workers=WARMUP_WORKERS, progress=print_progress):
+        """Decode, verify and cache images in parallel; returns the (folder, img_name) of failures"""
+        item_ids = list(item_ids)
+        failed = images.warmup([catalog.img_paths[item_id] for item_id in item_ids], workers, progress)
+        failed_images = set()
+        for item_id in item_ids:
+            img_path = catalog.img_paths[item_id]
+            if img_path in failed:
+                print(f"Excluding unreadable image {img_path}: {failed[img_path]}")
+                failed_images.add((catalog.folder_of(item_id), catalog.img_names[item_id]))
+        return failed_images
+
+    def warmup_images(self, workers=WARMUP_WORKERS, progress=print_progress):
+        """Decode, verify and cache every image in parallel, excluding failures from assignment"""
+        snapshot = self.snapshot
+        failed_images = self._warmup(snapshot.images, snapshot.catalog, range(len(snapshot.catalog)), workers, progress)
+        with self.lock:
+            self.failed_images = failed_images
+            self.snapshot = self._make_snapshot(snapshot.catalog, snapshot.images, failed_images)
+        return failed_images
+
+    def image_bytes(self, item_id, snapshot=None):
+        """Encoded display image for an item"""
+        return (snapshot or self.snapshot).image_bytes(item_id)
+
+    def _usable_images(self, folder, catalog, failed_images=None):
+        """Image names of a folder that can be assigned"""
+        failed_images = self.failed_images if failed_images is None else failed_images
+        return [
+            catalog.img_names[item_id] for item_id in catalog.folder_ids[folder]
+            if (folder, catalog.img_names[item_id]) not in failed_images
+        ]
+
+    def changed_folders(self):
+        """Folders whose annotations or images changed, appeared or disappeared since they were loaded"""
+        root = self.study.root_dir
+        folders = set(get_all_folders(root)) | set(self.signatures)
+        return sorted(
+            folder for folder in folders
+            if folder_signature(os.path.join(root, folder)) != self.signatures.get(folder)
+        )
+
+    def reload_folder(self, folder):
+        """Re-read one folder and swap in a new snapshot for sessions that start from now on.
+
+        Only this folder's annotations, item parameters and images are read
+        again; the other folders' data is reused as is.
+        """
+        root = self.study.root_dir
+        folder_path = os.path.join(root, folder)
+        signature = folder_signature(folder_path)
+        signatures = {**self.signatures, folder: signature}
+        all_images = dict(self.all_images)
+        item_params = dict(self.item_params)
+        attributes = None
+        if os.path.exists(os.path.join(folder_path, "annotations.json")):
+            all_images[folder] = self.shared.folder_images(root, folder, self.study.answer_key, signature)
+            item_params[folder] = load_item_params(folder_path)
+            attributes = folder_attributes(root, folder, all_images[folder])
+        else:
+            all_images.pop(folder, None)
+            item_params.pop(folder, None)
+        folders = sorted(all_images)
+        catalog = self.shared.catalog(root, self.study.answer_key, signatures, all_images)
+
+        # Changed images are hashed and, if their content changed, decoded again; the old snapshot keeps its own bytes
+        old = self.snapshot
+        images = old.images.without(
+            old.catalog.img_paths[item_id] for item_id in old.catalog.folder_ids.get(folder, [])
+        )
+        failed_images = {key for key in self.failed_images if key[0] != folder}
+        if WARMUP_IMAGES and folder in catalog.folder_ids:
+            failed_images |= self._warmup(images, catalog, catalog.folder_ids[folder], progress=None)
+
+        with self.lock:
+            self.item_params = item_params
+            snapshot = self._make_snapshot(catalog, images, failed_images)
+            if folder in all_images:
+                self._init_tracking(self.tracking_data, folder, all_images[folder])
+                self.stats.add_folder(catalog, folder, attributes)
+            self.all_images = all_images
+            self.all_folders = folders
+            self.failed_images = failed_images
+            self.signatures[folder] = signature
+            self.snapshot = snapshot
+        return snapshot
+
+    def check_for_updates(self):
+        """Reload every changed folder; returns the folders reloaded.
+
+        A folder that fails to load (a half-written annotations.json, say) is
+        reported once and keeps its previous version until its files change
+        again; the folders after it are still reloaded.
+        """
+        root = self.study.root_dir
+        reloaded = []
+        for folder in self.changed_folders():
+            signature = folder_signature(os.path.join(root, folder))
+            if self._failed_signatures.get(folder) == signature:
+                continue
+            try:
+                self.reload_folder(folder)
+            except Exception as e:
+                self._failed_signatures[folder] = signature
+                print(f"Reload of {folder} failed: {e}")
+                continue
+            self._failed_signatures.pop(folder, None)
+            reloaded.append(folder)
+        return reloaded
+
+    def start_watcher(self, interval=RELOAD_INTERVAL):
+        """Poll the dataset folders for changes in a background thread"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    for folder in self.check_for_updates():
+                        print(f"Reloaded {folder}")
+                except Exception as e:
+                    # Folders that fail are handled by check_for_updates; this catches listing errors
+                    print(f"Reload failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def _get_all_folders(self):
+        """Get all folders that contain annotations.json"""
+        return get_all_folders(self.study.root_dir)
+
+    def _load_all_images(self):
+        """Load all images and their questions from all folders"""
+        return {
+            folder: self.shared.folder_images(self.study.root_dir, folder, self.study.answer_key, self.signatures[folder])
+            for folder in self.all_folders
+        }
+
+    def _load_tracking_data(self):
+        """Load tracking data for image distribution"""
+        tracking_file = self.study.path(TRACKING_FILE)
+        if os.path.exists(tracking_file):
+            with open(tracking_file, 'r') as f:
+                tracking = json.load(f)
+        else:
+            tracking = {}
+        # Older files list "<name>_<time>" strings; they are registered and converted on load
+        for images in tracking.values():
+            for data in images.values():
+                data["shown_to_users"] = member_array(data["shown_to_users"], self.participants)
+        for folder in self.all_folders:
+            self._init_tracking(tracking, folder, self.all_images[folder])
+        return tracking
+
+    def _init_tracking(self, tracking, folder, folder_images):
+        """Initialize tracking data for any image of a folder not tracked yet"""
+        folder_tracking = tracking.setdefault(folder, {})
+        for img_name in folder_images.keys():
+            folder_tracking.setdefault(img_name, {
+                "shown_count": 0,
+                "shown_to_users": array("I")
+            })
+
+    def _load_stats(self):
+        """Build live aggregates once from the tracking and results files"""
+        root = self.study.root_dir
+        attributes = {folder: folder_attributes(root, folder, self.all_images[folder]) for folder in self.all_folders}
+        stats = LiveStats(self.catalog, attributes)
+        stats.seed_exposures(self.tracking_data)
+        stats.seed_results(self.study.path(RESULTS_FILE), self.catalog)
+        return stats
+
+    def _save_tracking_data(self):
+        """Save tracking data to file"""
+        with open(self.study.path(TRACKING_FILE), 'w') as f:
+            json.dump(self.tracking_data, f, separators=(",", ":"), default=list)
+
+    def get_calibration_images(self):
+        """Get one sample image from each folder for calibration"""
+        return self._calibration_images(self.catalog, self.failed_images)
+
+    def _calibration_images(self, catalog, failed_images):
+        calibration_images = {}
+
+        for folder in catalog.folders:
+            # Get the first available image from each folder for calibration
+            usable = self._usable_images(folder, catalog, failed_images)
+            if usable:
+                calibration_images[folder] = [usable[0]]
+
+        return calibration_images
+
+    def get_images_for_user(self, user_id, catalog=None):
+        """Get images for a specific user ensuring fair distribution"""
+        with self.lock:
+            return self._assign_images(user_id, catalog or self.catalog)
+
+    def _assign_images(self, user_id, catalog):
+        user_images = {}
+
+        for folder in catalog.folders:
+            usable = self._usable_images(folder, catalog)
+            # Hand out the next planned block if there is one
+            selected_images = None
+            if self.plan is not None:
+                selected_images = self.plan.next_block(folder, set(usable))
+            if selected_images is None:
+                selected_images = self._pick_least_shown(folder, user_id, usable)
+
+            # Update tracking data
+            for img_name in selected_images:
+                self._mark_shown(folder, img_name, user_id)
+
+            user_images[folder] = selected_images
+
+        self._save_tracking_data()
+        if self.plan is not None:
+            self.plan.save_cursors(self.study.path(PLAN_CURSOR_FILE))
+        return user_images
+
+    def register_participant(self, name, age=0, gender=""):
+        """Compact integer ID for a new participant"""
+        return self.participants.register(name, age, gender)
+
+    def _mark_shown(self, folder, img_name, user_id):
+        """Count one exposure of an image to a user"""
+        if add_member(self.tracking_data[folder][img_name]["shown_to_users"], user_id):
+            self.tracking_data[folder][img_name]["shown_count"] += 1
+            self.stats.record_exposure(folder, img_name)
+
+    def mark_item_shown(self, user_id, item_id, catalog=None):
+        """Track an item picked on the fly (adaptive mode) as shown to a user"""
+        catalog = catalog or self.catalog
+        with self.lock:
+            self._mark_shown(catalog.folder_of(item_id), catalog.img_names[item_id], user_id)
+            self._save_tracking_data()
+
+    def _pick_least_shown(self, folder, user_id, usable):
+        """Pick images of a folder at random among unseen or least shown ones"""
+        per_folder = self.study.images_per_folder
+        # Get images that this user hasn't seen
+        available_images = []
+        for img_name in usable:
+            if not has_member(self.tracking_data[folder][img_name]["shown_to_users"], user_id):
+                available_images.append(img_name)
+
+        # If we don't have enough unseen images, include some that have been shown least
+        if len(available_images) < per_folder:
+            # Sort by shown_count to get least shown images
+            all_images_sorted = sorted(
+                usable,
+                key=lambda x: self.tracking_data[folder][x]["shown_count"]
+            )
+
+            # Add images until we have enough, prioritizing least shown
+            for img_name in all_images_sorted:
+                if img_name not in available_images:
+                    available_images.append(img_name)
+                if len(available_images) >= per_folder:
+                    break
+
+        # Randomly select per_folder from available
+        if len(available_images) >= per_folder:
+            selected_images = random.sample(available_images, per_folder)
+        else:
+            selected_images = available_images
+
+        return selected_images
+
+    def get_items_for_user(self, user_id, snapshot=None):
+        """Assign images to a user and return them as a shuffled array of item IDs of snapshot's catalog"""
+        catalog = (snapshot or self.snapshot).catalog
+        order = catalog.order_for(self.get_images_for_user(user_id, catalog))
+        # Shuffle questions to randomize order across folders
+        random.shuffle(order)
+        return order
+
+    def next_adaptive_item(self, user_id, state, order, snapshot=None):
+        """Pick the next adaptive question, append it to order and track it; None when finished"""
+        snapshot = snapshot or self.snapshot
+        catalog = snapshot.catalog
+        excluded = {catalog.ids[key] for key in self.failed_images if key in catalog.ids}
+        tracking = self.tracking_data
+
+        def exposures(candidate):
+            # Balances use among equally informative items, as the fixed assignment does
+            entry = tracking.get(catalog.folder_of(candidate), {}).get(catalog.img_names[candidate])
+            return entry["shown_count"] if entry else 0
+
+        item_id = snapshot.adaptive.select_next(state, excluded.union(order), exposures)
+        if item_id is not None:
+            order.append(item_id)
+            self.mark_item_shown(user_id, item_id, catalog)
+        return item_id
+
+    def get_csv_columns(self):
+        """Generate all CSV column names"""
+        columns = ["participant_id", "name", "age", "gender"]
+
+        all_images = self.all_images
+        for folder in sorted(all_images):
+            for img_name in sorted(all_images[folder].keys()):
+                # Remove file extension for cleaner column names
+                img_base = image_base(img_name)
+                columns.append(f"{folder}_{img_base}_response")
+                columns.append(f"{folder}_{img_base}_time")
+
+        return columns
+
+    def save_user_results(self, user_data, order, responses, times, catalog=None, participant_id=None):
+        """Save user results to CSV, and to the result store when the participant ID is known
+
+        order, responses and times are parallel: item IDs in the order they were
+        answered, option indices and response times in seconds. Item IDs refer
+        to catalog, by default the current one.
+
+        The participant ID is the idempotency key: a participant's results are
+        committed once, and saving them again writes nothing and returns False.
+        Raises ValueError if the ID already holds different results, which
+        means the result store does not belong with the participants table.
+        """
+        catalog = catalog or self.catalog
+        columns = self.get_csv_columns()
+
+        # Initialize row with empty values
+        row_data = dict.fromkeys(columns, "")
+
+        # Fill in user data
+        row_data["participant_id"] = "" if participant_id is None else participant_id
+        row_data["name"] = user_data["name"]
+        row_data["age"] = user_data["age"]
+        row_data["gender"] = user_data["gender"]
+
+        # Fill in responses and times for shown images
+        for item_id, response, time_taken in zip(order, responses, times):
+            prefix = catalog.column_prefixes[item_id]
+            row_data[f"{prefix}_response"] = OPTION_LABELS[response] if response != NO_RESPONSE else ""
+            row_data[f"{prefix}_time"] = round(time_taken, 2)
+
+        items = [
+            (catalog.folder_of(item_id), catalog.img_names[item_id],
+             OPTION_LABELS[response] if response != NO_RESPONSE else "", round(time_taken, 2))
+            for item_id, response, time_taken in zip(order, responses, times)
+        ]
+        with self.lock:
+            # The store's write-once insert decides whether this is the first commit
+            if participant_id is not None and not self.results.save(participant_id, user_data, items):
+                record = self.results.get(participant_id)
+                if record is not None and [
+                    (item["folder"], item["img_name"], item["response"], item["time"]) for item in record["items"]
+                ] == items:
+                    return False
+                raise ValueError(f"participant {participant_id} already has other results stored; "
+                                 f"{self.results.path} does not match the participants table")
+            try:
+                self._append_results_row(row_data)
+            except Exception:
+                # Leave no half-committed record, so saving again can retry
+                if participant_id is not None:
+                    self.results.discard(participant_id)
+                raise
+
+        # Update live aggregates once the row is stored
+        for item_id, response, time_taken in zip(order, responses, times):
+            self.stats.record_answer(
+                catalog.folder_of(item_id),
+                catalog.img_names[item_id],
+                catalog.is_correct(item_id, response),
+                round(time_taken, 2)
+            )
+        self.stats.save_sketches(self.study.path(RT_SKETCH_FILE))
+        return True
+
+    def _append_results_row(self, row_data):
+        """Append one row to the results CSV in the file's column order.
+
+        If the dataset gained items since the file was created, the header is
+        widened first (a one-off rewrite) so existing rows stay aligned.
+        """
+        results_file = self.study.path(RESULTS_FILE)
+        if not os.path.exists(results_file):
+            pd.DataFrame([row_data]).to_csv(results_file, mode='w', header=True, index=False)
+            return
+        with open(results_file, newline="") as f:
+            header = next(csv.reader(f), [])
+        missing = [column for column in row_data if column not in header]
+        if missing:
+            existing = pd.read_csv(results_file, dtype=str, keep_default_na=False)
+            header = header + missing
+            # Replaced, not rewritten in place, so an export reading the old file finishes on it
+            existing.reindex(columns=header, fill_value="").to_csv(results_file + ".tmp", mode='w', header=True, index=False)
+            os.replace(results_file + ".tmp", results_file)
+        pd.DataFrame([row_data]).reindex(columns=header, fill_value="").to_csv(results_file, mode='a', header=False, index=False)
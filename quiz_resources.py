@@ -0,0 +1,69 @@
+import streamlit as st
+
+from admin import ADMIN_KEY, is_admin_key
+from admission import AdmissionControl
+from profiler import Profiler
+from quiz_api import SERVE_WITH_APP, serve_in_thread
+from quiz_manager import QuizManager, SharedCaches
+from studies import DEFAULT_STUDY, load_studies
+
+
+@st.cache_resource
+def get_studies():
+    """Studies this process hosts, read from studies.json at startup"""
+    return load_studies()
+
+
+@st.cache_resource
+def get_shared_caches():
+    """Parsed folders, catalogs and display images shared by every study's manager"""
+    return SharedCaches()
+
+
+@st.cache_resource(show_spinner="Loading quiz images...")
+def get_quiz_manager(study=DEFAULT_STUDY):
+    """A study's quiz manager, shared by every session and page; sessions only hold item IDs"""
+    quiz_manager = QuizManager(get_studies()[study], get_shared_caches())
+    quiz_manager.start_watcher()
+    if SERVE_WITH_APP and study == DEFAULT_STUDY:
+        # Both front ends then assign from, and save to, the same manager
+        serve_in_thread(quiz_manager)
+    return quiz_manager
+
+
+def current_study():
+    """The study of this session, taken from ?study= on its first rerun and kept for the session"""
+    if "study" not in st.session_state:
+        study = st.query_params.get("study", DEFAULT_STUDY)
+        if study not in get_studies():
+            st.error(f"Unknown study: {study}")
+            st.stop()
+        st.session_state.study = study
+    return st.session_state.study
+
+
+def admin_unlocked():
+    """Whether this session has entered QUIZ_ADMIN_KEY; asks for it until it has.
+
+    Without a configured key nothing is unlocked, so admin views stay closed by default.
+    """
+    if st.session_state.get("admin"):
+        return True
+    if not ADMIN_KEY:
+        return False
+    if is_admin_key(st.text_input("Admin key:", type="password", key="admin_key_input")):
+        st.session_state.admin = True
+        return True
+    return False
+
+
+@st.cache_resource
+def get_admission():
+    """Admission control shared by every session of the app"""
+    return AdmissionControl()
+
+
+@st.cache_resource
+def get_profiler():
+    """Profiler shared by every session, armed from the dashboard or the URL"""
+    return Profiler()
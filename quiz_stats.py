@@ -0,0 +1,223 @@
+import csv
+import math
+import os
+import threading
+from itertools import combinations
+
+from rt_sketch import KLLSketch, save_sketch_file
+
+
+class RunningStats:
+    """Exposure, accuracy and response time counters for one image or category"""
+
+    __slots__ = ("exposures", "answered", "correct", "rt_count", "rt_sum", "rt_sumsq", "rt_min", "rt_max", "rt_sketch")
+
+    def __init__(self):
+        self.exposures = 0
+        self.answered = 0
+        self.correct = 0
+        self.rt_count = 0
+        self.rt_sum = 0.0
+        self.rt_sumsq = 0.0
+        self.rt_min = math.inf
+        self.rt_max = 0.0
+        self.rt_sketch = KLLSketch()
+
+    def add_answer(self, is_correct, time_taken):
+        self.answered += 1
+        if is_correct:
+            self.correct += 1
+        if time_taken is not None:
+            self.rt_count += 1
+            self.rt_sum += time_taken
+            self.rt_sumsq += time_taken * time_taken
+            self.rt_min = min(self.rt_min, time_taken)
+            self.rt_max = max(self.rt_max, time_taken)
+            self.rt_sketch.update(time_taken)
+
+    def summary(self):
+        """Plain dict of derived values for display"""
+        mean = self.rt_sum / self.rt_count if self.rt_count else None
+        std = None
+        if self.rt_count > 1:
+            variance = (self.rt_sumsq - self.rt_count * mean * mean) / (self.rt_count - 1)
+            std = math.sqrt(max(variance, 0.0))
+        summary = {
+            "exposures": self.exposures,
+            "answered": self.answered,
+            "correct_rate": self.correct / self.answered if self.answered else None,
+            "rt_mean": mean,
+            "rt_std": std,
+            "rt_min": self.rt_min if self.rt_count else None,
+            "rt_max": self.rt_max if self.rt_count else None
+        }
+        summary.update(self.rt_sketch.summary())
+        return summary
+
+
+class AttributeCube:
+    """Aggregates per folder for every combination of annotation attribute values.
+
+    An item with fields like difficulty, shape and candidate_order belongs
+    to one cell of every group-by over a subset of its fields (at most
+    2^3 - 1 of them), and each answer updates all of those cells. A slice
+    such as accuracy by shape and difficulty is then a lookup of ready
+    counters, however many results have arrived. Not thread-safe on its
+    own; LiveStats guards it with its lock.
+    """
+
+    def __init__(self):
+        self.cells = {}  # (folder, fields) -> {values: RunningStats}, fields sorted
+        self.item_cells = {}  # folder -> {img_name: [RunningStats of every cell the image belongs to]}
+
+    def add_items(self, folder, attributes):
+        """Index a folder's images by their attributes, {img_name: {field: value}}; existing counts are kept"""
+        item_cells = {}
+        for img_name, item in attributes.items():
+            fields = sorted(item)
+            item_cells[img_name] = [
+                self.cells.setdefault((folder, subset), {}).setdefault(tuple(item[f] for f in subset), RunningStats())
+                for size in range(1, len(fields) + 1)
+                for subset in combinations(fields, size)
+            ]
+        self.item_cells[folder] = item_cells
+
+    def cells_of(self, folder, img_name):
+        return self.item_cells.get(folder, {}).get(img_name, ())
+
+    def fields(self, folder):
+        """Attribute fields that folder's images have"""
+        return sorted({fields[0] for (f, fields) in self.cells if f == folder and len(fields) == 1})
+
+    def rows(self, folder, fields):
+        """One summary row per combination of values of fields, in the order given"""
+        key = tuple(sorted(fields))
+        position = [key.index(field) for field in fields]
+        return [
+            dict({field: values[i] for field, i in zip(fields, position)}, **stats.summary())
+            for values, stats in sorted(self.cells.get((folder, key), {}).items())
+        ]
+
+
+class LiveStats:
+    """In-memory aggregates per image and per category, updated incrementally.
+
+    Exposures are counted on assignment and answers on save, so reading the
+    aggregates never touches the tracking or results files. With item
+    attributes ({folder: {img_name: {field: value}}}, see attributes.py)
+    the same counts are also kept per attribute value in a cube.
+    """
+
+    def __init__(self, catalog, attributes=None):
+        self.lock = threading.Lock()
+        self.items = {}  # folder -> {img_name: RunningStats}
+        self.categories = {}
+        self.cube = AttributeCube()
+        for folder in catalog.folders:
+            self.categories[folder] = RunningStats()
+            self.items[folder] = {catalog.img_names[item_id]: RunningStats() for item_id in catalog.folder_ids[folder]}
+        for folder, folder_attributes in (attributes or {}).items():
+            self.cube.add_items(folder, folder_attributes)
+
+    def add_folder(self, catalog, folder, attributes=None):
+        """Start empty counters for a folder's new images after a reload; existing counts are kept"""
+        with self.lock:
+            self._category(folder)
+            for item_id in catalog.folder_ids[folder]:
+                self._item(folder, catalog.img_names[item_id])
+            if attributes is not None:
+                self.cube.add_items(folder, attributes)
+
+    def _item(self, folder, img_name):
+        folder_items = self.items.setdefault(folder, {})
+        if img_name not in folder_items:
+            folder_items[img_name] = RunningStats()
+        return folder_items[img_name]
+
+    def _category(self, folder):
+        if folder not in self.categories:
+            self.categories[folder] = RunningStats()
+        return self.categories[folder]
+
+    def record_exposure(self, folder, img_name, count=1):
+        with self.lock:
+            self._item(folder, img_name).exposures += count
+            self._category(folder).exposures += count
+            for stats in self.cube.cells_of(folder, img_name):
+                stats.exposures += count
+
+    def record_answer(self, folder, img_name, is_correct, time_taken):
+        with self.lock:
+            self._item(folder, img_name).add_answer(is_correct, time_taken)
+            self._category(folder).add_answer(is_correct, time_taken)
+            for stats in self.cube.cells_of(folder, img_name):
+                stats.add_answer(is_correct, time_taken)
+
+    def seed_exposures(self, tracking_data):
+        """Start exposure counts from the persisted tracking data"""
+        for folder, images in tracking_data.items():
+            for img_name, data in images.items():
+                self.record_exposure(folder, img_name, data["shown_count"])
+
+    def seed_results(self, results_file, catalog):
+        """Replay a results CSV once at startup, streaming it row by row"""
+        if not os.path.exists(results_file):
+            return
+        prefix_items = {prefix: item_id for item_id, prefix in enumerate(catalog.column_prefixes)}
+        with open(results_file, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            # (item ID, response column, time column) for every known item in this file
+            columns = []
+            index = {name: i for i, name in enumerate(header)}
+            for name, i in index.items():
+                if name.endswith("_response") and name[:-len("_response")] in prefix_items:
+                    prefix = name[:-len("_response")]
+                    columns.append((prefix_items[prefix], i, index.get(f"{prefix}_time")))
+            for row in reader:
+                for item_id, response_col, time_col in columns:
+                    if response_col >= len(row) or not row[response_col]:
+                        continue
+                    time_taken = None
+                    if time_col is not None and time_col < len(row) and row[time_col]:
+                        time_taken = float(row[time_col])
+                    self.record_answer(
+                        catalog.folder_of(item_id),
+                        catalog.img_names[item_id],
+                        row[response_col] == catalog.correct_letter(item_id),
+                        time_taken
+                    )
+
+    def category_rows(self):
+        """One summary row per category"""
+        with self.lock:
+            return [dict(category=folder, **stats.summary()) for folder, stats in sorted(self.categories.items())]
+
+    def item_rows(self, folder):
+        """One summary row per image of a category"""
+        with self.lock:
+            return [dict(image=img_name, **stats.summary()) for img_name, stats in sorted(self.items.get(folder, {}).items())]
+
+    def attribute_fields(self, folder):
+        """Attribute fields a category can be sliced by"""
+        with self.lock:
+            return self.cube.fields(folder)
+
+    def attribute_rows(self, folder, fields):
+        """One summary row per combination of values of the given attribute fields of a category"""
+        with self.lock:
+            return self.cube.rows(folder, fields)
+
+    def save_sketches(self, path):
+        """Persist the response time sketches so replicas and shards can be merged"""
+        with self.lock:
+            sketches = {
+                "categories": {folder: stats.rt_sketch for folder, stats in self.categories.items()},
+                "items": {
+                    folder: {img_name: stats.rt_sketch for img_name, stats in images.items()}
+                    for folder, images in self.items.items()
+                }
+            }
+            save_sketch_file(path, sketches)
@@ -0,0 +1,159 @@
+import argparse
+import csv
+import io
+import os
+import time
+import zlib
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    # zstd exports are offered only where the package is installed; gzip always works
+    zstandard = None
+
+from participants import has_member
+from quiz_manager import RESULTS_FILE, get_all_folders, root_dir
+from results_store import RESULTS_DB, ResultStore
+
+EXPORT_CHUNK_BYTES = 1 << 20  # CSV text gathered before it is compressed and handed on
+# Streamlit holds a download's bytes in memory, so the dashboard exports results files up to
+# this size and points to this script (or the API's streaming export) for larger ones
+DASHBOARD_EXPORT_LIMIT = 200 * 10 ** 6
+COMPRESSIONS = ["gzip", "zstd", "none"] if zstandard is not None else ["gzip", "none"]
+EXTENSIONS = {"gzip": ".csv.gz", "zstd": ".csv.zst", "none": ".csv"}
+MEDIA_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd", "none": "text/csv"}
+
+
+def _compressor(compression):
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 writes a gzip header and trailer
+    if compression == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor().compressobj()
+    if compression == "none":
+        return None
+    raise ValueError(f"unsupported compression {compression!r}; choose from {', '.join(COMPRESSIONS)}")
+
+
+def _complete_lines(f, size):
+    """Decoded lines of a binary file up to byte size, leaving out a last line still being appended"""
+    read = 0
+    for line in f:
+        read += len(line)
+        if read > size or not line.endswith(b"\n"):
+            return
+        yield line.decode("utf-8")
+
+
+def column_folder(column, folders):
+    """Folder an item column belongs to: the longest folder name it starts with, or None"""
+    matches = [folder for folder in folders if column.startswith(folder + "_")]
+    return max(matches, key=len) if matches else None
+
+
+def export_chunks(results_file=RESULTS_FILE, folders=None, participant_ids=None, compression="gzip",
+                  known_folders=(), chunk_bytes=EXPORT_CHUNK_BYTES):
+    """Yield the results CSV, filtered and compressed, in chunks of bounded size.
+
+    folders keeps the participant columns and those folders' item columns,
+    and only rows that answered any of them. participant_ids, a sorted ID
+    array, keeps only those participants' rows. known_folders names every
+    folder, so a folder whose name starts another's is told apart.
+
+    The file is read row by row up to its size when the export starts, so
+    memory stays at one chunk however large the file is, and rows saved
+    meanwhile are left for the next export.
+    """
+    compressor = _compressor(compression)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def take():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor is not None else data
+
+    with open(results_file, 'rb') as f:
+        reader = csv.reader(_complete_lines(f, os.fstat(f.fileno()).st_size))
+        header = next(reader, [])
+        known = set(known_folders) | set(folders or ())
+        keep = [
+            i for i, column in enumerate(header)
+            if folders is None or not column.endswith(("_response", "_time")) or column_folder(column, known) in folders
+        ]
+        answers = [i for i in keep if header[i].endswith("_response")]
+        id_column = header.index("participant_id") if "participant_id" in header else None
+        writer.writerow([header[i] for i in keep])
+        for row in reader:
+            if participant_ids is not None:
+                participant = row[id_column] if id_column is not None and id_column < len(row) else ""
+                if not participant.isdigit() or not has_member(participant_ids, int(participant)):
+                    continue
+            if folders is not None and not any(i < len(row) and row[i] for i in answers):
+                continue
+            writer.writerow([row[i] if i < len(row) else "" for i in keep])
+            if buffer.tell() >= chunk_bytes:
+                data = take()
+                if data:
+                    yield data
+    data = take()
+    if compressor is not None:
+        data += compressor.flush()
+    yield data
+
+
+def export_participants(results, since=None, until=None, participant_ids=None):
+    """Sorted ID array of participants completed in [since, until) (Unix times), within participant_ids if given.
+
+    results is the ResultStore holding the completion times. None if nothing
+    restricts the export to particular participants.
+    """
+    if since is None and until is None:
+        return None if participant_ids is None else array("I", sorted(set(participant_ids)))
+    completed = results.completed_between(since, until)
+    if participant_ids is None:
+        return completed
+    wanted = set(participant_ids)
+    return array("I", (participant_id for participant_id in completed if participant_id in wanted))
+
+
+def parse_day(text):
+    """Unix time of local midnight at the start of a YYYY-MM-DD day"""
+    return time.mktime(datetime.strptime(text, "%Y-%m-%d").timetuple())
+
+
+def day_range(since=None, until=None):
+    """(since, until) Unix times for an inclusive range of YYYY-MM-DD days; either may be None"""
+    start = parse_day(since) if since else None
+    end = time.mktime((datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)).timetuple()) if until else None
+    return start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export results as a filtered, compressed CSV without loading it into memory")
+    parser.add_argument("--results", default=RESULTS_FILE, help="Detailed results CSV")
+    parser.add_argument("--db", default=RESULTS_DB, help="Results database, for the completion dates")
+    parser.add_argument("--since", help="First day completed, YYYY-MM-DD")
+    parser.add_argument("--until", help="Last day completed, YYYY-MM-DD")
+    parser.add_argument("--category", action="append", help="Keep only this category's columns (repeatable)")
+    parser.add_argument("--participant", type=int, action="append", help="Keep only this participant ID (repeatable)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="gzip")
+    parser.add_argument("--output", help="Output file (default: results_export plus the format's extension)")
+    args = parser.parse_args()
+
+    output = args.output or "results_export" + EXTENSIONS[args.compression]
+    since, until = day_range(args.since, args.until)
+    participant_ids = export_participants(ResultStore(args.db), since, until, args.participant)
+    start = time.time()
+    written = 0
+    with open(output, 'wb') as f:
+        for chunk in export_chunks(args.results, args.category, participant_ids, args.compression, get_all_folders(root_dir)):
+            f.write(chunk)
+            written += len(chunk)
+    print(f"Wrote {output} ({written / 1e6:.1f} MB) in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+
+def load_response_matrix(results_file, catalog, with_times=False):
+    """Scored responses as a participants x items matrix: 1 correct, 0 wrong, NaN not shown.
+
+    With with_times, also return the matching matrix of response times (NaN if missing).
+    """
+    prefix_items = {prefix: item_id for item_id, prefix in enumerate(catalog.column_prefixes)}
+    header = pd.read_csv(results_file, nrows=0).columns
+    response_cols = [c for c in header if c.endswith("_response") and c[:-len("_response")] in prefix_items]
+    time_cols = [f"{c[:-len('_response')]}_time" for c in response_cols] if with_times else []
+    df = pd.read_csv(results_file, usecols=response_cols + [c for c in time_cols if c in header], dtype=str)
+
+    scores = np.full((len(df), len(catalog)), np.nan)
+    times = np.full((len(df), len(catalog)), np.nan) if with_times else None
+    for col in response_cols:
+        prefix = col[:-len("_response")]
+        item_id = prefix_items[prefix]
+        answered = df[col].notna().to_numpy()
+        correct = (df[col] == catalog.correct_letter(item_id)).to_numpy()
+        scores[answered, item_id] = correct[answered]
+        if with_times and f"{prefix}_time" in df:
+            times[:, item_id] = pd.to_numeric(df[f"{prefix}_time"], errors="coerce").to_numpy()
+    if with_times:
+        return scores, times
+    return scores
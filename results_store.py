@@ -0,0 +1,125 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+from array import array
+
+RESULTS_DB = "results.sqlite"  # One record per participant, keyed by participant ID
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    participant_id INTEGER PRIMARY KEY,
+    name TEXT,
+    age TEXT,
+    gender TEXT,
+    completed REAL,
+    items TEXT
+)
+"""
+
+
+class ResultStore:
+    """Completed quizzes by participant ID in SQLite.
+
+    A participant's record holds their answers in the order they were asked,
+    so looking one up is a primary-key read rather than a scan of the results
+    CSV. Records are written once and never replaced.
+    """
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        # Sessions run on different threads; the lock serializes use of the one connection
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def save(self, participant_id, user_data, items, completed=None):
+        """Store a participant's answers; False if they already have a record.
+
+        items is a list of (folder, img_name, response letter, seconds) in the order asked.
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    participant_id,
+                    user_data["name"],
+                    str(user_data["age"]),
+                    user_data["gender"],
+                    time.time() if completed is None else completed,
+                    json.dumps(items, separators=(",", ":"))
+                )
+            )
+            self.connection.commit()
+            return cursor.rowcount == 1
+
+    def discard(self, participant_id):
+        """Remove a record whose commit could not be completed"""
+        with self.lock:
+            self.connection.execute("DELETE FROM results WHERE participant_id = ?", (participant_id,))
+            self.connection.commit()
+
+    def get(self, participant_id):
+        """A participant's record, or None if they have not completed the quiz"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT participant_id, name, age, gender, completed, items FROM results WHERE participant_id = ?",
+                (participant_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "participant_id": row[0],
+            "name": row[1],
+            "age": row[2],
+            "gender": row[3],
+            "completed": row[4],
+            "items": [
+                {"folder": folder, "img_name": img_name, "response": response, "time": seconds}
+                for folder, img_name, response, seconds in json.loads(row[5])
+            ]
+        }
+
+    def recent(self, limit=20):
+        """(participant ID, name, completed) of the latest records"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT participant_id, name, completed FROM results ORDER BY completed DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def completed_between(self, since=None, until=None):
+        """Sorted ID array of participants completed in [since, until), Unix times; None leaves a side open"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT participant_id FROM results WHERE completed >= ? AND completed < ? ORDER BY participant_id",
+                (-math.inf if since is None else since, math.inf if until is None else until)
+            )
+            return array("I", (row[0] for row in rows))
+
+    def max_id(self):
+        """Highest participant ID with a record, or -1 if there are none"""
+        with self.lock:
+            row = self.connection.execute("SELECT MAX(participant_id) FROM results").fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def records(self, batch=1000):
+        """Every record as (participant ID, name, age, gender, completed, items), read in batches by ID"""
+        last = -1
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT participant_id, name, age, gender, completed, items FROM results "
+                    "WHERE participant_id > ? ORDER BY participant_id LIMIT ?", (last, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for participant_id, name, age, gender, completed, items in rows:
+                yield participant_id, name, age, gender, completed, json.loads(items)
+            last = rows[-1][0]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -0,0 +1,215 @@
+import argparse
+import json
+import math
+import random
+
+DEFAULT_K = 128  # Accuracy parameter; quantile error is roughly 1.7 / k
+REPORT_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+class Compactor(list):
+    """One level of a KLL sketch; every value at level h stands for 2**h answers"""
+
+    def compact(self):
+        """Halve the level, returning the surviving values for the next level up"""
+        self.sort()
+        # Keep one value behind if the count is odd so total weight is conserved
+        leftover = self.pop() if len(self) % 2 else None
+        offset = random.getrandbits(1)
+        promoted = self[offset::2]
+        self.clear()
+        if leftover is not None:
+            self.append(leftover)
+        return promoted
+
+
+class KLLSketch:
+    """Mergeable streaming quantile sketch (Karnin, Lang and Liberty) for response times.
+
+    Memory stays bounded by roughly 3 * k values however many answers are added,
+    and two sketches merge into one that summarizes both streams.
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.compactors = [Compactor()]
+        self.size = 0
+        self.max_size = self._capacity(0)
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _grow(self):
+        self.compactors.append(Compactor())
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for h in range(len(self.compactors)):
+                if len(self.compactors[h]) >= self._capacity(h):
+                    if h + 1 >= len(self.compactors):
+                        self._grow()
+                    self.compactors[h + 1].extend(self.compactors[h].compact())
+                    self.size = sum(len(c) for c in self.compactors)
+                    break
+            else:
+                break
+
+    def update(self, value):
+        self.n += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for h, compactor in enumerate(other.compactors):
+            self.compactors[h].extend(compactor)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.size = sum(len(c) for c in self.compactors)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at each quantile in qs, in one pass over the sketch"""
+        if self.n == 0:
+            return [None for _ in qs]
+        weighted = sorted((value, 1 << h) for h, compactor in enumerate(self.compactors) for value in compactor)
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+                continue
+            if q >= 1:
+                results.append(self.max)
+                continue
+            target = q * total
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    results.append(value)
+                    break
+            else:
+                results.append(self.max)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def summary(self):
+        """p50/p90/p99 and an upper outlier threshold (Tukey fence at Q3 + 1.5 IQR)"""
+        q25, q50, q75, q90, q99 = self.quantiles(REPORT_QUANTILES)
+        return {
+            "rt_p50": q50,
+            "rt_p90": q90,
+            "rt_p99": q99,
+            "rt_outlier": q75 + 1.5 * (q75 - q25) if self.n else None
+        }
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "n": self.n,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            "levels": [list(c) for c in self.compactors]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        if sketch.n:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        sketch.compactors = [Compactor(level) for level in data["levels"]] or [Compactor()]
+        sketch.size = sum(len(c) for c in sketch.compactors)
+        sketch.max_size = sum(sketch._capacity(h) for h in range(len(sketch.compactors)))
+        return sketch
+
+
+def load_sketch_file(path):
+    """Read a persisted {"categories": ..., "items": ...} sketch file"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {
+        "categories": {folder: KLLSketch.from_dict(s) for folder, s in data.get("categories", {}).items()},
+        "items": {
+            folder: {img_name: KLLSketch.from_dict(s) for img_name, s in images.items()}
+            for folder, images in data.get("items", {}).items()
+        }
+    }
+
+
+def save_sketch_file(path, sketches):
+    """Write sketches compactly, as written by load_sketch_file"""
+    data = {
+        "categories": {folder: s.to_dict() for folder, s in sketches["categories"].items()},
+        "items": {
+            folder: {img_name: s.to_dict() for img_name, s in images.items()}
+            for folder, images in sketches["items"].items()
+        }
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def merge_sketch_files(paths):
+    """Merge sketch files from several replicas or historic shards"""
+    merged = {"categories": {}, "items": {}}
+    for path in paths:
+        shard = load_sketch_file(path)
+        for folder, sketch in shard["categories"].items():
+            if folder in merged["categories"]:
+                merged["categories"][folder].merge(sketch)
+            else:
+                merged["categories"][folder] = sketch
+        for folder, images in shard["items"].items():
+            merged_images = merged["items"].setdefault(folder, {})
+            for img_name, sketch in images.items():
+                if img_name in merged_images:
+                    merged_images[img_name].merge(sketch)
+                else:
+                    merged_images[img_name] = sketch
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge and report response time sketches")
+    parser.add_argument("files", nargs="+", help="Sketch files written by the quiz app")
+    parser.add_argument("-o", "--output", help="Write the merged sketches to this file")
+    parser.add_argument("--items", action="store_true", help="Also report every image")
+    args = parser.parse_args()
+
+    merged = merge_sketch_files(args.files)
+    if args.output:
+        save_sketch_file(args.output, merged)
+
+    def report(label, sketch):
+        s = sketch.summary()
+        if sketch.n:
+            print(f"{label:<50} n={sketch.n:<7} p50={s['rt_p50']:.2f} p90={s['rt_p90']:.2f} "
+                  f"p99={s['rt_p99']:.2f} outlier>{s['rt_outlier']:.2f}")
+
+    for folder, sketch in sorted(merged["categories"].items()):
+        report(folder, sketch)
+        if args.items:
+            for img_name, item_sketch in sorted(merged["items"].get(folder, {}).items()):
+                report(f"  {img_name}", item_sketch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import re
+import time
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from attributes import load_attributes
+from quiz_manager import OPTION_LABELS, RESULTS_FILE, load_catalog, options_for_folder, root_dir
+from results_io import load_response_matrix
+
+# An option letter after "answer" or "option": a capital, or a lowercase one closed by a
+# bracket, punctuation or the end, so the article in "Answer: a cube rotated" is not read as A
+OPTION_LETTER = r"\(?([A-F](?![A-Za-z])|[a-f](?=\s*[).,;:]|\s*$))"
+
+# Ways a model states its choice, tried in order; the first hit wins
+ANSWER_PATTERNS = [
+    re.compile(r"^\s*\(?([a-f])\)?\s*[.:)]?\s*$", re.IGNORECASE),  # "d", "(d)", "D."
+    re.compile(r"(?i:\banswer\s*(?:is|:)?\s*(?:option\s*)?)" + OPTION_LETTER),
+    re.compile(r"(?i:\boption\s*)" + OPTION_LETTER),
+    re.compile(r"\(([a-f])\)", re.IGNORECASE),
+    re.compile(r"(?<![A-Za-z])([A-F])(?![A-Za-z])")  # A standalone capital letter
+]
+
+ID_KEYS = ("image", "image_id", "id", "img_name", "img_path")
+PREDICTION_KEYS = ("prediction", "answer", "response", "output")
+
+
+@lru_cache(maxsize=65536)
+def normalize_prediction(text):
+    """Option letter stated in a model's free-text or letter answer, or "" if none"""
+    for pattern in ANSWER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).upper()
+    return ""
+
+
+class ItemResolver:
+    """Map the image identifiers used in prediction files to catalog item IDs"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.by_name = defaultdict(list)
+        for (folder, img_name), item_id in catalog.ids.items():
+            self.by_name[img_name].append(item_id)
+            self.by_name[os.path.splitext(img_name)[0]].append(item_id)
+
+    def resolve(self, image, folder=None):
+        """Item ID for "folder/img.png", a path, or a bare name (with folder or unique), else None"""
+        image = image.replace("\\", "/")
+        parts = image.split("/")
+        if len(parts) >= 2 and folder is None:
+            folder = parts[-2]
+        name = parts[-1]
+        candidates = self.by_name.get(name, [])
+        if folder is not None:
+            candidates = [i for i in candidates if self.catalog.folder_of(i) == folder]
+        return candidates[0] if len(candidates) == 1 else None
+
+
+def score_stream(paths, catalog, model_name=None):
+    """Stream prediction JSONL files into per-model, per-item answered/correct counts"""
+    resolver = ItemResolver(catalog)
+    resolved = {}  # Identifiers repeat across models and runs, so resolve each once
+    counts = {}
+    skipped = defaultdict(int)
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                image = next((record[k] for k in ID_KEYS if k in record), None)
+                prediction = next((record[k] for k in PREDICTION_KEYS if k in record), None)
+                if image is None or prediction is None:
+                    skipped["malformed"] += 1
+                    continue
+                key = (str(image), record.get("folder"))
+                if key not in resolved:
+                    resolved[key] = resolver.resolve(*key)
+                item_id = resolved[key]
+                if item_id is None:
+                    skipped["unknown image"] += 1
+                    continue
+                model = model_name or record.get("model", os.path.splitext(os.path.basename(path))[0])
+                if model not in counts:
+                    counts[model] = (array("I", [0]) * len(catalog), array("I", [0]) * len(catalog))
+                answered, correct = counts[model]
+                answered[item_id] += 1
+                letter = normalize_prediction(str(prediction))
+                if letter not in options_for_folder(catalog.folder_of(item_id)):
+                    skipped["no option letter"] += 1
+                elif OPTION_LABELS.index(letter) == catalog.correct[item_id]:
+                    correct[item_id] += 1
+    return counts, dict(skipped)
+
+
+def human_counts(results_file, catalog):
+    """Per-item answered/correct counts from the human results"""
+    if not os.path.exists(results_file):
+        return None
+    scores = load_response_matrix(results_file, catalog)
+    return (~np.isnan(scores)).sum(axis=0), np.nansum(scores, axis=0)
+
+
+def comparison_table(catalog, attributes, human, models):
+    """Side-by-side accuracy per folder and per (folder, attribute, value) slice"""
+    groups = defaultdict(list)
+    for item_id in range(len(catalog)):
+        folder = catalog.folder_of(item_id)
+        groups[(folder, "", "")].append(item_id)
+        for field, value in attributes[item_id].items():
+            groups[(folder, field, value)].append(item_id)
+
+    rows = []
+    for (folder, field, value), ids in sorted(groups.items()):
+        row = {"folder": folder, "attribute": field, "value": value}
+        sources = ([("human", human)] if human is not None else []) + sorted(models.items())
+        for name, (answered, correct) in sources:
+            n = sum(int(answered[i]) for i in ids)
+            row[f"{name}_n"] = n
+            row[f"{name}_accuracy"] = sum(int(correct[i]) for i in ids) / n if n else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score model predictions against the quiz answer keys")
+    parser.add_argument("predictions", nargs="+", help="JSONL files with one {image, prediction} record per line")
+    parser.add_argument("--model", help="Model name for all files (default: record 'model' field or file name)")
+    parser.add_argument("--results", default=RESULTS_FILE, help="Human results CSV to compare against")
+    parser.add_argument("-o", "--output", help="Also write the table to this CSV")
+    args = parser.parse_args()
+
+    start = time.time()
+    catalog = load_catalog()
+    counts, skipped = score_stream(args.predictions, catalog, args.model)
+    table = comparison_table(catalog, load_attributes(catalog, root_dir), human_counts(args.results, catalog), counts)
+    if args.output:
+        table.to_csv(args.output, index=False)
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    for reason, count in sorted(skipped.items()):
+        print(f"Skipped ({reason}): {count}")
+    print(f"Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import base64
+import os
+from array import array
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from image_cache import encode_display
+
+BUNDLE_WIDTH = 1000  # The runner shows images at most 1000px wide
+BUNDLE_FORMAT = "WEBP"
+RUNNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bundle_runner")
+
+# Static page implementing Streamlit's component protocol; no build step needed
+runner = components.declare_component("session_runner", path=RUNNER_DIR)
+
+
+@st.cache_data(show_spinner=False, max_entries=10000)
+def bundle_image(img_path, mtime_ns):
+    """An image as a data URL in the bundle's format, cached until the file changes"""
+    data = encode_display(img_path, BUNDLE_WIDTH, BUNDLE_FORMAT)
+    return f"data:image/{BUNDLE_FORMAT.lower()};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def build_bundle(snapshot, order):
+    """Everything the runner needs for a session's items, in the order they are asked.
+
+    Answer keys stay on the server; the runner only reports option indices.
+    """
+    catalog = snapshot.catalog
+    items = []
+    for item_id in order:
+        img_path = catalog.img_paths[item_id]
+        items.append({
+            "folder": catalog.folder_of(item_id),
+            "question": catalog.questions[item_id],
+            "options": catalog.options(item_id),
+            "image": bundle_image(img_path, os.stat(img_path).st_mtime_ns)
+        })
+    return {"items": items}
+
+
+def read_answers(value, order, catalog):
+    """Response and time arrays from the runner's posted answers.
+
+    Raises ValueError if the answers do not match the session's items.
+    """
+    responses = value.get("responses") if isinstance(value, dict) else None
+    times = value.get("times") if isinstance(value, dict) else None
+    if not isinstance(responses, list) or not isinstance(times, list) or not len(responses) == len(times) == len(order):
+        raise ValueError(f"expected {len(order)} answers")
+    for item_id, response, seconds in zip(order, responses, times):
+        if not isinstance(response, int) or not 0 <= response < len(catalog.options(item_id)):
+            raise ValueError(f"invalid response {response!r}")
+        if not isinstance(seconds, (int, float)) or seconds < 0:
+            raise ValueError(f"invalid response time {seconds!r}")
+    return array("b", responses), array("f", [round(seconds, 2) for seconds in times])
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import quiz_manager
+from assignment_planner import ASSIGNMENT_PLAN_FILE, PLAN_CURSOR_FILE
+from participants import PARTICIPANTS_FILE
+from quiz_manager import ADAPTIVE_MODE, RESULTS_FILE, RT_SKETCH_FILE, TRACKING_FILE, Study
+from results_store import RESULTS_DB
+
+RECORD_TRACES = False  # Record an anonymized trace of every completed session
+TRACE_FILE = "session_traces.jsonl"  # One trace per line
+
+_file_lock = threading.Lock()
+
+
+def new_trace():
+    """An empty trace; it holds timings and item positions, never who the participant is"""
+    return {"id": uuid.uuid4().hex, "started": time.time(), "events": []}
+
+
+def record(trace, event, **fields):
+    """Append an event, stamped with seconds since the session started"""
+    trace["events"].append({"t": round(time.time() - trace["started"], 3), "event": event, **fields})
+
+
+def record_answers(trace, responses, times):
+    """Answer events for a batch answered client side, timed from the test start by their response times"""
+    t = next((e["t"] for e in reversed(trace["events"]) if e["event"] == "test_start"), 0.0)
+    for n, (response, seconds) in enumerate(zip(responses, times)):
+        t += seconds
+        trace["events"].append({"t": round(t, 3), "event": "answer", "n": n, "response": response, "rt": round(seconds, 2)})
+
+
+def save_trace(trace, path=TRACE_FILE):
+    """Append a finished trace to the trace file"""
+    line = json.dumps({"id": trace["id"], "events": trace["events"]}, separators=(",", ":"))
+    with _file_lock:
+        with open(path, 'a') as f:
+            f.write(line + "\n")
+
+
+def load_traces(path):
+    """Traces of a trace file that reached the test, in recorded order"""
+    traces = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                trace = json.loads(line)
+                if any(e["event"] == "test_start" for e in trace["events"]):
+                    traces.append(trace)
+    return traces
+
+
+class Recorder:
+    """Latencies per operation and completed sessions, collected from replay threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.sessions = 0
+        self.late = []  # Seconds an event started behind its scheduled time
+
+    def add(self, operation, seconds):
+        with self.lock:
+            self.latencies[operation].append(seconds)
+
+    def timed(self, operation, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.add(operation, time.perf_counter() - start)
+        return result
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def replay_trace(trace, manager, recorder, speed):
+    """Drive one trace against a QuizManager, pacing its events at speed x real time (0 = no waits).
+
+    Each event does the server work the app does at that point: images for
+    calibration and questions, assignment at the test start, adaptive picks
+    per answer and the results commit at the end. Items are assigned anew,
+    so the trace supplies the pacing and the answers by position.
+    """
+    start = time.perf_counter()
+    snapshot = manager.snapshot
+    catalog = snapshot.catalog
+    participant_id = None
+    order = None
+    adaptive = None
+    responses = array("b")
+    times = array("f")
+    for event in trace["events"]:
+        if speed:
+            delay = start + event["t"] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.001:
+                with recorder.lock:
+                    recorder.late.append(-delay)
+        kind = event["event"]
+        if kind == "calibration":
+            # The last calibration event is the summary page, which shows no image
+            if event.get("n", 0) < len(snapshot.calibration_order):
+                recorder.timed("calibration_image", snapshot.image_bytes, snapshot.calibration_order[event.get("n", 0)])
+        elif kind == "start":
+            participant_id = recorder.timed("register_participant", manager.register_participant, "replay", 0, "")
+        elif kind == "test_start":
+            if participant_id is None:
+                participant_id = manager.register_participant("replay", 0, "")
+            if ADAPTIVE_MODE:
+                adaptive = snapshot.adaptive.new_state()
+                order = catalog.new_order()
+                recorder.timed("next_adaptive_item", manager.next_adaptive_item, participant_id, adaptive, order, snapshot)
+            else:
+                order = recorder.timed("get_items_for_user", manager.get_items_for_user, participant_id, snapshot)
+            if len(order):
+                recorder.timed("question_image", snapshot.image_bytes, order[0])
+        elif kind == "answer" and order is not None and len(responses) < len(order):
+            item_id = order[len(responses)]
+            response = min(event.get("response", 0), len(catalog.options(item_id)) - 1)
+            responses.append(response)
+            times.append(event.get("rt", 0.0))
+            if ADAPTIVE_MODE:
+                snapshot.adaptive.update(adaptive, item_id, catalog.is_correct(item_id, response))
+                recorder.timed("next_adaptive_item", manager.next_adaptive_item, participant_id, adaptive, order, snapshot)
+            if len(responses) < len(order):
+                recorder.timed("question_image", snapshot.image_bytes, order[len(responses)])
+        elif kind == "complete" and order is not None and len(responses):
+            user_data = {"name": "replay", "age": 0, "gender": ""}
+            # Positions the trace never answered (a shorter recorded session) are left unanswered
+            del order[len(responses):]
+            recorder.timed("save_user_results", manager.save_user_results,
+                           user_data, order, responses, times, catalog, participant_id)
+            with recorder.lock:
+                recorder.sessions += 1
+
+
+def replay(traces, manager, speed=1.0, parallel=10):
+    """Replay traces with up to parallel sessions at once; returns the Recorder and wall time"""
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        for future in [pool.submit(replay_trace, trace, manager, recorder, speed) for trace in traces]:
+            future.result()
+    return recorder, time.perf_counter() - start
+
+
+def report(recorder, wall):
+    """Print latency percentiles per operation and overall throughput"""
+    print(f"{'operation':<22} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    operations = 0
+    for operation, values in sorted(recorder.latencies.items()):
+        operations += len(values)
+        print(f"{operation:<22} {len(values):>7} {percentile(values, 0.5) * 1000:>9.2f} "
+              f"{percentile(values, 0.95) * 1000:>9.2f} {percentile(values, 0.99) * 1000:>9.2f} {max(values) * 1000:>9.2f}")
+    print(f"\n{recorder.sessions} sessions in {wall:.2f}s: {recorder.sessions / wall:.2f} sessions/s, {operations / wall:.1f} operations/s")
+    if recorder.late:
+        print(f"Events behind schedule: {len(recorder.late)}, median {statistics.median(recorder.late) * 1000:.1f} ms late")
+
+
+def copy_study_data(study, workdir):
+    """Copy a study's data files into workdir, so a replay starts from, but never writes to, the live ones"""
+    data_dir = os.path.abspath(study.data_dir)
+    if os.path.commonpath([data_dir, os.path.abspath(study.root_dir)]) == data_dir:
+        # The data directory also holds the stimuli (the default study's does), so only its data files are copied
+        for name in (TRACKING_FILE, RESULTS_FILE, PARTICIPANTS_FILE, ASSIGNMENT_PLAN_FILE, PLAN_CURSOR_FILE, RT_SKETCH_FILE):
+            if os.path.exists(os.path.join(data_dir, name)):
+                shutil.copy(os.path.join(data_dir, name), os.path.join(workdir, name))
+    else:
+        shutil.copytree(data_dir, workdir, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns(RESULTS_DB, RESULTS_DB + "-wal", RESULTS_DB + "-shm"))
+    store = os.path.join(data_dir, RESULTS_DB)
+    if os.path.exists(store):
+        # Through SQLite, so a store the app is writing to is copied consistently
+        source = sqlite3.connect(store)
+        target = sqlite3.connect(os.path.join(workdir, RESULTS_DB))
+        source.backup(target)
+        target.close()
+        source.close()
+
+
+def main():
+    from studies import DEFAULT_STUDY, load_studies
+
+    parser = argparse.ArgumentParser(description="Replay recorded session traces against QuizManager and report latency and throughput")
+    parser.add_argument("traces", nargs="?", help=f"Trace file recorded by the app (default: the study's {TRACE_FILE})")
+    parser.add_argument("--study", default=DEFAULT_STUDY, help="Study the traces were recorded in, from studies.json")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pacing: 1 is real time, 10 is ten times faster, 0 is no waiting")
+    parser.add_argument("--parallel", type=int, default=10, help="Sessions replayed at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the traces this many times, for more load")
+    parser.add_argument("--limit", type=int, help="Replay only the first N traces")
+    parser.add_argument("--warmup", action="store_true",
+                        help="Decode every image before replaying, to measure a warm server instead of a fresh start")
+    parser.add_argument("--workdir", help="Where the replay's copy of the study's data files goes "
+                                          "(default: a temporary directory)")
+    args = parser.parse_args()
+
+    studies = load_studies()
+    if args.study not in studies:
+        parser.error(f"unknown study {args.study}")
+    study = studies[args.study]
+    traces_file = args.traces or study.path(TRACE_FILE)
+    traces = load_traces(traces_file)[:args.limit] * args.repeat
+    if not traces:
+        parser.error(f"no traces that reach the test in {traces_file}")
+
+    # The replay writes to copies of every data file the study keeps (tracking, results,
+    # the result store and the assignment plan), so it saves and assigns as the live app does
+    workdir = args.workdir or tempfile.mkdtemp(prefix="quiz_replay_")
+    os.makedirs(workdir, exist_ok=True)
+    copy_study_data(study, workdir)
+    replay_study = Study(study.name, os.path.abspath(study.root_dir), workdir, study.images_per_folder, study.answer_key)
+
+    manager = quiz_manager.QuizManager(replay_study)
+    if args.warmup:
+        manager.warmup_images(progress=None)
+    print(f"Replaying {len(traces)} traces, {args.parallel} at a time, at {args.speed or 'unpaced'}x, in {workdir}")
+    recorder, wall = replay(traces, manager, args.speed, args.parallel)
+    report(recorder, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import json
+import os
+import re
+
+from quiz_manager import Study
+
+STUDIES_FILE = "studies.json"  # Studies hosted beside the default one, selected with ?study=<name>
+STUDIES_DIR = "studies"  # Data files of a study without a data_dir go in studies/<name>/
+DEFAULT_STUDY = "default"
+STUDY_NAME = re.compile(r"^[A-Za-z0-9_-]+$")  # Names appear in URLs and directory names
+
+# studies.json maps a study name to its settings, all optional:
+# {
+#     "pilot": {
+#         "root_dir": "./pilot_stimuli",
+#         "data_dir": "studies/pilot",
+#         "images_per_folder": 3,
+#         "answer_key": {"paper_folding": "answer"}
+#     }
+# }
+
+
+def load_studies(path=STUDIES_FILE):
+    """Study name -> Study; the default study, from quiz_manager's settings, is always present"""
+    studies = {DEFAULT_STUDY: Study.default()}
+    if not os.path.exists(path):
+        return studies
+    with open(path, 'r') as f:
+        config = json.load(f)
+    for name, settings in config.items():
+        if not STUDY_NAME.match(name) or name == DEFAULT_STUDY:
+            raise ValueError(f"{path}: invalid study name {name!r}")
+        data_dir = settings.get("data_dir", os.path.join(STUDIES_DIR, name))
+        os.makedirs(data_dir, exist_ok=True)
+        studies[name] = Study(
+            name,
+            settings.get("root_dir", Study.default().root_dir),
+            data_dir,
+            settings.get("images_per_folder"),
+            settings.get("answer_key")
+        )
+    return studies